@@ -0,0 +1,133 @@
+AGGREGATE_VERSION = 1  # bump when the fields below change, stored aggregates are then rebuilt from the games
+
+# Stats for which the highest value in a single game is kept, with the champion it was played on
+MAX_STATS = ("total_damage", "total_heal", "cc_duration", "gold_earned", "highest_crit", "largestKillingSpree")
+ABILITIES = (("Q", "ability_1_used"), ("W", "ability_2_used"), ("E", "ability_3_used"), ("R", "ability_4_used"))
+
+
+class UserAggregate:
+    """Running totals over all arena games of a user, updated once per ingested game."""
+
+    def __init__(self):
+        self.games_played = 0
+        self.placements = {}  # place -> count
+        self.place_sum = 0
+        self.kills = 0
+        self.deaths = 0
+        self.assists = 0
+        self.total_heal = 0
+        self.total_shielding = 0
+        self.max_stats = {}  # stat -> [value, champion]
+        self.most_ability_usage = None  # [total casts, champion, [ability, casts]]
+        self.champion_counts = {}
+
+    @classmethod
+    def from_games(cls, games):
+        aggregate = cls()
+        for game in games:
+            aggregate.add_game(game)
+        return aggregate
+
+    @classmethod
+    def from_columns(cls, columns, user_key):
+        """Same result as from_games, computed with batched operations on a ColumnarGames store."""
+        aggregate = cls()
+        aggregate.games_played = columns.game_count(user_key)
+        if not aggregate.games_played:
+            return aggregate
+        aggregate.placements = columns.placement_histogram(user_key)
+        aggregate.place_sum = sum(place * total for place, total in aggregate.placements.items())
+        aggregate.champion_counts = columns.champion_counts(user_key)
+        aggregate.kills = columns.stat_sum('total_kills', user_key)
+        aggregate.deaths = columns.stat_sum('total_deaths', user_key)
+        aggregate.assists = columns.stat_sum('total_assists', user_key)
+        aggregate.total_heal = columns.stat_sum('total_heal', user_key)
+        aggregate.total_shielding = columns.stat_sum('total_shielding_on_teammate', user_key)
+
+        for stat in MAX_STATS:
+            value, champion = columns.stat_max(stat, user_key)
+            if value > 0:
+                aggregate.max_stats[stat] = [value, champion]
+
+        # Total casts per game, ties on the highest total are broken like the tuple comparison in add_game
+        start, end = columns.offsets[user_key]
+        ability_columns = [columns.stats[key][start:end] for _, key in ABILITIES]
+        totals = list(map(sum, zip(*ability_columns)))
+        highest = max(totals)
+        for index in (index for index, total in enumerate(totals) if total == highest):
+            casts = [(ability, column[index]) for (ability, _), column in zip(ABILITIES, ability_columns)]
+            usage = [highest, columns.champions[columns.champion[start + index]], list(max(casts, key=lambda cast: cast[1]))]
+            if aggregate.most_ability_usage is None or usage > aggregate.most_ability_usage:
+                aggregate.most_ability_usage = usage
+        return aggregate
+
+    def add_game(self, game):
+        stats = game.stats
+        champion = game.champion
+        place = game.place
+
+        self.games_played += 1
+        if place is not None:
+            self.placements[place] = self.placements.get(place, 0) + 1
+            self.place_sum += place
+        self.champion_counts[champion] = self.champion_counts.get(champion, 0) + 1
+
+        self.kills += stats.total_kills
+        self.deaths += stats.total_deaths
+        self.assists += stats.total_assists
+        self.total_heal += stats.total_heal
+        self.total_shielding += stats.total_shielding_on_teammate
+
+        for stat in MAX_STATS:
+            value = getattr(stats, stat)
+            if value > self.max_stats.get(stat, [0])[0]:
+                self.max_stats[stat] = [value, champion]
+
+        casts = [(ability, getattr(stats, key)) for ability, key in ABILITIES]
+        usage = [sum(count for _, count in casts), champion, list(max(casts, key=lambda cast: cast[1]))]
+        if self.most_ability_usage is None or usage > self.most_ability_usage:
+            self.most_ability_usage = usage
+
+    # Queries
+    def most_played_champions(self, count=5):
+        return sorted(self.champion_counts.items(), key=lambda item: item[1], reverse=True)[:count]
+
+    def placement_count(self, predicate):
+        return sum(total for place, total in self.placements.items() if predicate(place))
+
+    def average_place(self):
+        return self.place_sum / self.games_played if self.games_played else 0
+
+    def most_stat(self, stat):
+        value, champion = self.max_stats.get(stat, (0, "No data"))
+        return value, champion
+
+    # Serialization
+    def to_dict(self):
+        return {
+            "version": AGGREGATE_VERSION,
+            "games_played": self.games_played,
+            "placements": {str(place): total for place, total in self.placements.items()},
+            "place_sum": self.place_sum,
+            "kills": self.kills,
+            "deaths": self.deaths,
+            "assists": self.assists,
+            "total_heal": self.total_heal,
+            "total_shielding": self.total_shielding,
+            # Copies, the flush serializes them on another thread
+            "max_stats": dict(self.max_stats),
+            "most_ability_usage": self.most_ability_usage,
+            "champion_counts": dict(self.champion_counts)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Returns None for aggregates stored by another version."""
+        if not data or data.get("version") != AGGREGATE_VERSION:
+            return None
+        aggregate = cls()
+        for key, value in data.items():
+            if key != "version":
+                setattr(aggregate, key, value)
+        aggregate.placements = {int(place): total for place, total in data["placements"].items()}
+        return aggregate
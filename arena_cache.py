@@ -0,0 +1,438 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from arena_storage import ArenaStorage, USER_FIELDS
+from arena_journal import ArenaJournal
+from arena_records import ArenaGame
+from arena_aggregates import UserAggregate
+from arena_columns import ColumnarGames
+from champion_index import ChampionIndex
+
+FLUSH_INTERVAL = 5  # seconds to wait for more changes before writing to the storage
+
+
+class UserView:
+    """In-memory data of a single user. Read only, all changes go through ArenaGamesCache."""
+
+    def __init__(self, user_key, profile, games, manual_wins, aggregate=None):
+        self.user_key = user_key
+        self.profile = {key: profile.get(key) for key in USER_FIELDS}
+        self.games = games
+        self.manual_wins = manual_wins
+        self.aggregate = aggregate or UserAggregate.from_games(games.values())
+        self.win_mask = 0  # unique win champions as a ChampionIndex bitmask, kept up to date by ArenaGamesCache
+        self._wins = None
+        self._unique_wins = None
+
+    def get(self, key, default=None):
+        value = self.profile.get(key)
+        return default if value is None else value
+
+    def wins(self):
+        # All games where 'place' is 1, sorted on 'timestamp'
+        if self._wins is None:
+            self._wins = sorted((game for game in self.games.values() if game.place == 1), key=lambda game: game.timestamp)
+        return self._wins
+
+    def unique_win_champions(self):
+        if self._unique_wins is None:
+            self._unique_wins = {game.champion for game in self.wins()}
+        return self._unique_wins
+
+    def has_won(self, champion):
+        return champion in self.unique_win_champions()
+
+    def _invalidate(self):
+        self._wins = None
+        self._unique_wins = None
+
+
+class ArenaGamesCache:
+    """Process-wide owner of the arena games data.
+
+    Users are loaded from the storage once and kept in memory. Changes are applied to the
+    in-memory view right away, the changed users are marked dirty and written to the storage
+    in the background after FLUSH_INTERVAL seconds, and on close(). With a journal, every change
+    is also logged right away, so the changes of the last seconds survive a crash.
+    """
+
+    def __init__(self, storage: ArenaStorage, champion_index: ChampionIndex, flush_interval=FLUSH_INTERVAL,
+                 journal: ArenaJournal = None):
+        self.storage = storage
+        self.champion_index = champion_index
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self._replaying = False
+        self._user_locks = {}
+        self._views = {}
+        self._all_loaded = False
+        self._columns = ColumnarGames()  # games of all loaded users, see columns()
+        self._stale_columns = set()  # users of which the games changed since their columns were added
+        self._puuids = {}  # puuid -> user_key of all registered summoners
+        self._dirty_profiles = set()
+        self._dirty_games = {}
+        self._dirty_manual_wins = set()
+        self._dirty_aggregates = set()
+        self._dirty_event = None
+        self._flush_task = None
+        self._writer = None  # thread of the storage and journal writes, while the flusher task runs
+        self._listeners = []  # called with (user_key, unique wins) when the unique wins of a user change
+
+    # Reading
+    def get_user(self, user_key):
+        if user_key not in self._views and not self._all_loaded:
+            profile = self.storage.get_user(user_key)
+            if profile is None:
+                return None
+            manual_wins = {win['champion']: win['timestamp'] for win in self.storage.get_manual_wins(user_key)}
+            aggregate = self._load_aggregate(user_key, self.storage.get_aggregate(user_key))
+            self._views[user_key] = self._new_view(user_key, profile, self.storage.get_games(user_key), manual_wins, aggregate)
+        return self._views.get(user_key)
+
+    def _new_view(self, user_key, profile, games, manual_wins, aggregate=None):
+        view = UserView(user_key, profile, games, manual_wins, aggregate)
+        view.win_mask = self.champion_index.mask(view.unique_win_champions())
+        return view
+
+    def _load_aggregate(self, user_key, data):
+        aggregate = UserAggregate.from_dict(data)
+        if aggregate is None:
+            # Missing or outdated, UserView rebuilds it from the games and the rebuilt one gets stored
+            self._dirty_aggregates.add(user_key)
+            self._mark_dirty()
+        return aggregate
+
+    def users(self):
+        if not self._all_loaded:
+            self.load_all()
+        return list(self._views.values())
+
+    def load_all(self):
+        load_start = time.perf_counter()
+        all_games = self.storage.get_all_games()
+        all_manual_wins = self.storage.get_all_manual_wins()
+        all_aggregates = self.storage.get_all_aggregates()
+        profiles = [profile for profile in self.storage.get_users() if profile['user_key'] not in self._views]
+
+        # Columns of all games, for the guild-wide queries and to rebuild missing or outdated aggregates
+        # (e.g. after an AGGREGATE_VERSION bump) with batched operations
+        for profile in profiles:
+            self._columns.add_user(profile['user_key'], all_games.get(profile['user_key'], {}).values())
+        # Users that were loaded on their own before get their columns on the next columns() call
+        self._stale_columns.update(self._views)
+
+        for profile in profiles:
+            user_key = profile['user_key']
+            manual_wins = {win['champion']: win['timestamp'] for win in all_manual_wins.get(user_key, [])}
+            aggregate = UserAggregate.from_dict(all_aggregates.get(user_key))
+            if aggregate is None:
+                aggregate = UserAggregate.from_columns(self._columns, user_key)
+                self._dirty_aggregates.add(user_key)
+                self._mark_dirty()
+            self._views[user_key] = self._new_view(user_key, profile, all_games.get(user_key, {}), manual_wins, aggregate)
+        self._all_loaded = True
+        self._puuids = {view.profile['puuid']: view.user_key for view in self._views.values() if view.profile['puuid']}
+        metrics.arena_games_load_seconds.observe(time.perf_counter() - load_start)
+
+    def columns(self):
+        """All games as ColumnarGames, for guild-wide queries. The users whose games changed are added again first."""
+        if not self._all_loaded:
+            self.load_all()
+        for user_key in self._stale_columns:
+            self._columns.add_user(user_key, self._views[user_key].games.values())
+        self._stale_columns.clear()
+        if self._columns.unused > len(self._columns):
+            self._columns.compact()
+        return self._columns
+
+    def win_mask(self, user_key):
+        user_data = self.get_user(user_key)
+        return user_data.win_mask if user_data else 0
+
+    def won_by_any(self, user_keys):
+        """Bitmask of the champions at least one of the users has won with."""
+        mask = 0
+        for user_key in user_keys:
+            mask |= self.win_mask(user_key)
+        return mask
+
+    def won_by_all(self, user_keys):
+        """Bitmask of the champions every one of the users has won with."""
+        mask = self.champion_index.all_mask
+        for user_key in user_keys:
+            mask &= self.win_mask(user_key)
+        return mask
+
+    def sync_checkpoint(self, user_key):
+        """Progress of an interrupted sync, see CustomRiotAPI.update_arena_games. None without one."""
+        user_data = self.get_user(user_key)
+        checkpoint = user_data.profile['sync_checkpoint'] if user_data else None
+        return json.loads(checkpoint) if checkpoint else None
+
+    def user_keys_by_puuid(self):
+        if not self._all_loaded:
+            self.load_all()
+        return self._puuids
+
+    # Writing
+    def user_lock(self, user_key):
+        """asyncio.Lock of a user, for changes that await in between, like a sync."""
+        lock = self._user_locks.get(user_key)
+        if lock is None:
+            lock = self._user_locks[user_key] = asyncio.Lock()
+        return lock
+
+    def _log(self, record):
+        if self.journal is not None and not self._replaying:
+            self.journal.append(record)
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _wins_changed(self, view):
+        for callback in self._listeners:
+            callback(view.user_key, len(view.unique_win_champions()))
+
+    def _get_or_create(self, user_key):
+        view = self.get_user(user_key)
+        if view is None:
+            view = self._new_view(user_key, {}, {}, {})
+            self._views[user_key] = view
+            self._dirty_profiles.add(user_key)
+            self._wins_changed(view)
+        return view
+
+    def update_user(self, user_key, **fields):
+        """Create the user if needed and update the given (non-None) profile fields."""
+        self._log({"op": "user", "user_key": user_key, "fields": {
+            key: value for key, value in fields.items() if key in USER_FIELDS and value is not None
+        }})
+        view = self._get_or_create(user_key)
+        if fields.get('puuid') and fields['puuid'] != view.profile['puuid']:
+            self._puuids.pop(view.profile['puuid'], None)
+            self._puuids[fields['puuid']] = user_key
+        for key, value in fields.items():
+            if key in USER_FIELDS and value is not None:
+                view.profile[key] = value
+        self._dirty_profiles.add(user_key)
+        self._mark_dirty()
+        return view
+
+    def add_games(self, user_key, games):
+        """Add or replace games given as {match_id: ArenaGame}."""
+        self._log({"op": "games", "user_key": user_key, "games": {match_id: game.to_row() for match_id, game in games.items()}})
+        view = self._get_or_create(user_key)
+        replaced = any(match_id in view.games for match_id in games)
+        view.games.update(games)
+        view._invalidate()
+        if replaced:
+            view.aggregate = UserAggregate.from_games(view.games.values())
+            view.win_mask = self.champion_index.mask(view.unique_win_champions())
+        else:
+            for game in games.values():
+                view.aggregate.add_game(game)
+                if game.place == 1:
+                    view.win_mask |= self.champion_index.bit(game.champion)
+        if replaced or any(game.place == 1 for game in games.values()):
+            self._wins_changed(view)
+        self._dirty_games.setdefault(user_key, set()).update(games)
+        self._dirty_aggregates.add(user_key)
+        self._stale_columns.add(user_key)
+        self._mark_dirty()
+
+    def set_sync_checkpoint(self, user_key, checkpoint):
+        """None removes it. Flushed together with the games added before it, so it never gets ahead of them."""
+        self._log({"op": "sync_checkpoint", "user_key": user_key, "checkpoint": checkpoint})
+        view = self._get_or_create(user_key)
+        view.profile['sync_checkpoint'] = json.dumps(checkpoint) if checkpoint else None
+        self._dirty_profiles.add(user_key)
+        self._mark_dirty()
+
+    def add_manual_win(self, user_key, user_name, champion, timestamp):
+        """Returns False if the champion was already in the user's win list."""
+        view = self._get_or_create(user_key)
+        if view.profile['name'] is None:
+            self.update_user(user_key, name=user_name)
+        if champion in view.manual_wins:
+            return False
+        self._log({"op": "add_manual_win", "user_key": user_key, "user_name": user_name, "champion": champion, "timestamp": timestamp})
+        view.manual_wins[champion] = timestamp
+        self._dirty_manual_wins.add(user_key)
+        self._mark_dirty()
+        return True
+
+    def remove_manual_win(self, user_key, champion):
+        """Returns False if the champion was not in the user's win list."""
+        view = self.get_user(user_key)
+        if view is None:
+            return False
+        match = next((name for name in view.manual_wins if name.lower() == champion.lower()), None)
+        if match is None:
+            return False
+        self._log({"op": "remove_manual_win", "user_key": user_key, "champion": match})
+        del view.manual_wins[match]
+        self._dirty_manual_wins.add(user_key)
+        self._mark_dirty()
+        return True
+
+    # Journal
+    def replay_journal(self):
+        """Applies the changes a crash left in the journal and writes them to the storage. Returns the record count."""
+        records = self.journal.read()
+        self._replaying = True
+        try:
+            for record in records:
+                user_key = record["user_key"]
+                if record["op"] == "user":
+                    self.update_user(user_key, **record["fields"])
+                elif record["op"] == "games":
+                    self.add_games(user_key, {
+                        # Journals written before the compact records have the games as dicts
+                        match_id: ArenaGame.from_dict(game) if isinstance(game, dict) else ArenaGame.from_row(game)
+                        for match_id, game in record["games"].items()
+                    })
+                elif record["op"] == "add_manual_win":
+                    self.add_manual_win(user_key, record["user_name"], record["champion"], record["timestamp"])
+                elif record["op"] == "remove_manual_win":
+                    self.remove_manual_win(user_key, record["champion"])
+                elif record["op"] == "sync_checkpoint":
+                    self.set_sync_checkpoint(user_key, record["checkpoint"])
+        finally:
+            self._replaying = False
+        self.flush()
+        # Also drops an incomplete last record, new records must not be appended to it
+        self.journal.reset()
+        return len(records)
+
+    # Flushing
+    def _mark_dirty(self):
+        if self._dirty_event is not None:
+            self._dirty_event.set()
+
+    def is_dirty(self):
+        return bool(self._dirty_profiles or self._dirty_games or self._dirty_manual_wins or self._dirty_aggregates)
+
+    def _take_dirty(self):
+        """The data of all dirty users, copied on the event loop so the writer never sees a change halfway.
+
+        Returns the dirty sets, to mark them dirty again when the write fails, and the data to write.
+        """
+        dirty = (self._dirty_profiles, self._dirty_games, self._dirty_manual_wins, self._dirty_aggregates)
+        self._dirty_profiles, self._dirty_games, self._dirty_manual_wins, self._dirty_aggregates = set(), {}, set(), set()
+        dirty_profiles, dirty_games, dirty_manual_wins, dirty_aggregates = dirty
+        profiles = [(user_key, dict(self._views[user_key].profile)) for user_key in dirty_profiles]
+        games = []
+        for user_key, match_ids in dirty_games.items():
+            user_games = self._views[user_key].games
+            games.append((user_key, {match_id: user_games[match_id] for match_id in match_ids if match_id in user_games}))
+        manual_wins = [
+            (user_key, [{"champion": champion, "timestamp": timestamp} for champion, timestamp in self._views[user_key].manual_wins.items()])
+            for user_key in dirty_manual_wins
+        ]
+        aggregates = [(user_key, self._views[user_key].aggregate.to_dict()) for user_key in dirty_aggregates]
+        # The journal records that are not written yet are all part of this data
+        journal_lines = self.journal.take_pending() if self.journal is not None else []
+        return dirty, (profiles, games, manual_wins, aggregates, journal_lines)
+
+    def _restore_dirty(self, dirty):
+        dirty_profiles, dirty_games, dirty_manual_wins, dirty_aggregates = dirty
+        self._dirty_profiles |= dirty_profiles
+        for user_key, match_ids in dirty_games.items():
+            self._dirty_games.setdefault(user_key, set()).update(match_ids)
+        self._dirty_manual_wins |= dirty_manual_wins
+        self._dirty_aggregates |= dirty_aggregates
+
+    def _write(self, data):
+        # Blocking, runs on the writer thread while the flusher task is running
+        flush_start = time.perf_counter()
+        profiles, games, manual_wins, aggregates, journal_lines = data
+        try:
+            for user_key, profile in profiles:
+                self.storage.save_user(user_key, profile, commit=False)
+            for user_key, user_games in games:
+                self.storage.save_games(user_key, user_games, commit=False)
+            for user_key, wins in manual_wins:
+                self.storage.replace_manual_wins(user_key, wins, commit=False)
+            for user_key, aggregate in aggregates:
+                self.storage.save_aggregate(user_key, aggregate, commit=False)
+            self.storage.commit()
+        except Exception:
+            self.storage.rollback()
+            if journal_lines:
+                # The changes stay dirty in memory, they must stay in the journal too
+                self.journal.write(journal_lines)
+            raise
+        if self.journal is not None:
+            # Everything in the journal is in the storage now
+            self.journal.reset()
+        metrics.arena_games_flush_seconds.observe(time.perf_counter() - flush_start)
+
+    def flush(self):
+        """Write all dirty users to the storage in a single transaction, blocking. Not while the flusher task runs."""
+        if not self.is_dirty():
+            return
+        dirty, data = self._take_dirty()
+        try:
+            self._write(data)
+        except Exception:
+            # Keep the changes dirty so the next flush retries them
+            self._restore_dirty(dirty)
+            raise
+
+    async def flush_async(self):
+        """flush() on the writer thread. The journal writes use the same thread, so a reset can't drop later records."""
+        if not self.is_dirty():
+            return
+        dirty, data = self._take_dirty()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._writer, self._write, data)
+        except Exception:
+            self._restore_dirty(dirty)
+            raise
+
+    async def _flush_loop(self):
+        while True:
+            await self._dirty_event.wait()
+            # Debounce: give other changes the chance to end up in the same write
+            await asyncio.sleep(self.flush_interval)
+            self._dirty_event.clear()
+            try:
+                await self.flush_async()
+            except Exception as e:
+                print(f"Error while flushing arena games: {e}")
+                self._dirty_event.set()
+
+    def start(self):
+        """Start the background flusher, must be called from within the running event loop."""
+        if self._flush_task is None:
+            # A single thread, so the writes to the storage and the journal happen in the order they were started
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="arena-writer")
+            self._dirty_event = asyncio.Event()
+            if self.is_dirty():
+                self._dirty_event.set()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+            if self.journal is not None:
+                self.journal.start(self._writer)
+
+    async def close(self):
+        if self._flush_task is None:
+            self.flush()
+            if self.journal is not None:
+                await self.journal.close()
+            return
+        self._flush_task.cancel()
+        try:
+            await self._flush_task
+        except asyncio.CancelledError:
+            pass
+        self._flush_task = None
+        try:
+            # After the writes that are still running on the writer thread
+            await self.flush_async()
+        finally:
+            if self.journal is not None:
+                await self.journal.close()
+            self._writer.shutdown()
+            self._writer = None
@@ -0,0 +1,120 @@
+from array import array
+from collections import Counter
+from arena_records import STAT_FIELDS
+
+
+def _number(value):
+    return value if isinstance(value, int) else int(value or 0)
+
+
+class ColumnarGames:
+    """All games of all users as typed columns, one entry per game.
+
+    The games of a user are stored next to each other, `offsets[user_key]` gives the (start, end)
+    slice. Sums, maxima and counts then run over array slices in C instead of walking the game dicts.
+    Adding a user again appends a new block, the old one stays unused until compact().
+    """
+
+    def __init__(self):
+        self.champions = []  # champion id -> name
+        self.champion_ids = {}  # name -> champion id
+        self.offsets = {}
+        self.unused = 0  # entries of blocks that were replaced by a newer block of the same user
+        self.place = array('b')
+        self.timestamp = array('q')
+        self.champion = array('H')
+        self.stats = {stat: array('i') for stat in STAT_FIELDS}  # the stats of a single game fit in 32 bits
+
+    @classmethod
+    def from_users(cls, users):
+        """Builds the columns from ArenaGamesCache views (or anything with .user_key and .games)."""
+        columns = cls()
+        for user_data in users:
+            columns.add_user(user_data.user_key, user_data.games.values())
+        return columns
+
+    def _champion_id(self, name):
+        champion_id = self.champion_ids.get(name)
+        if champion_id is None:
+            champion_id = self.champion_ids[name] = len(self.champions)
+            self.champions.append(name)
+        return champion_id
+
+    def add_user(self, user_key, games):
+        previous = self.offsets.get(user_key)
+        if previous is not None:
+            self.unused += previous[1] - previous[0]
+        games = list(games)
+        start = len(self.place)
+        self.place.extend(game.place or 0 for game in games)
+        self.timestamp.extend(game.timestamp or 0 for game in games)
+        self.champion.extend(self._champion_id(game.champion) for game in games)
+        # Column by column, so the values are copied in C
+        for column, values in zip(self.stats.values(), zip(*(game.stats for game in games))):
+            try:
+                column.extend(values)
+            except TypeError:
+                # A float or None in an older game, extend() stopped at it
+                del column[start:]
+                column.extend(map(_number, values))
+        self.offsets[user_key] = (start, len(self.place))
+
+    def compact(self):
+        """Drops the unused blocks, by copying the slices of the current ones."""
+        columns = [self.place, self.timestamp, self.champion, *self.stats.values()]
+        compacted = [array(column.typecode) for column in columns]
+        offsets = {}
+        for user_key, (start, end) in self.offsets.items():
+            offsets[user_key] = (len(compacted[0]), len(compacted[0]) + end - start)
+            for column, new_column in zip(columns, compacted):
+                new_column.extend(column[start:end])
+        self.place, self.timestamp, self.champion = compacted[:3]
+        self.stats = dict(zip(self.stats, compacted[3:]))
+        self.offsets = offsets
+        self.unused = 0
+
+    def __len__(self):
+        return len(self.place) - self.unused
+
+    def _range(self, user_key=None):
+        if user_key is not None:
+            return self.offsets.get(user_key, (0, 0))
+        if self.unused:
+            self.compact()
+        return 0, len(self.place)
+
+    # Queries, for one user or for everyone when user_key is None
+    def game_count(self, user_key=None):
+        start, end = self._range(user_key)
+        return end - start
+
+    def stat_sum(self, stat, user_key=None):
+        start, end = self._range(user_key)
+        return sum(self.stats[stat][start:end])
+
+    def stat_max(self, stat, user_key=None):
+        """Highest value and the champion it was played on, the first game wins ties. None without games."""
+        start, end = self._range(user_key)
+        if start == end:
+            return None
+        column = self.stats[stat]
+        value = max(column[start:end])
+        index = column.index(value, start, end)
+        return value, self.champions[self.champion[index]]
+
+    def placement_histogram(self, user_key=None):
+        start, end = self._range(user_key)
+        places = self.place[start:end].tobytes()
+        histogram = {place: places.count(place) for place in range(1, 9)}
+        return {place: total for place, total in histogram.items() if total}
+
+    def champion_counts(self, user_key=None):
+        """Games per champion, in order of first appearance."""
+        start, end = self._range(user_key)
+        return {self.champions[champion_id]: total for champion_id, total in Counter(self.champion[start:end]).items()}
+
+    def user_sums(self, stat, user_keys=None):
+        """Sum of a stat for every user, or for the given ones, e.g. for guild-wide rankings. Users without games are left out."""
+        column = self.stats[stat]
+        offsets = self.offsets if user_keys is None else {user_key: self.offsets[user_key] for user_key in user_keys if user_key in self.offsets}
+        return {user_key: sum(column[start:end]) for user_key, (start, end) in offsets.items() if end > start}
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import threading
+
+JOURNAL_FILENAME = "arena_games.journal"
+FSYNC_DELAY = 0.05  # seconds to collect changes, they are written and fsynced together
+
+
+class ArenaJournal:
+    """Append-only log of the ArenaGamesCache changes that are not in the storage yet.
+
+    Every change is a JSON line. A background task writes them in batches, with a single fsync per batch.
+    Once a flush has written the changes to the storage, the journal is replaced by an empty one with an
+    atomic rename. Records only set values, so replaying one that is already in the storage does no harm.
+    The batches and the flushes run on the same writer thread, a reset then only drops records written before it.
+    """
+
+    def __init__(self, path=JOURNAL_FILENAME, fsync_delay=FSYNC_DELAY):
+        self.path = path
+        self.fsync_delay = fsync_delay
+        self._pending = []  # encoded records that are not written yet
+        self._file = open(path, "a", encoding="utf-8")
+        self._file_lock = threading.Lock()  # writes run in the executor, reset() swaps the file
+        self._pending_event = None
+        self._task = None
+        self._executor = None  # of the writes, the writer thread of ArenaGamesCache
+
+    def read(self):
+        """All records in the journal, up to the first incomplete one, i.e. a write cut off by a crash."""
+        records = []
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+        return records
+
+    def append(self, record):
+        self._pending.append(json.dumps(record, separators=(",", ":")) + "\n")
+        if self._pending_event is not None:
+            self._pending_event.set()
+
+    def take_pending(self):
+        """The records that are not written yet, for a flush that writes their changes to the storage."""
+        pending, self._pending = self._pending, []
+        return pending
+
+    def write(self, lines):
+        """Appends encoded records and fsyncs them, blocking."""
+        with self._file_lock:
+            self._file.write("".join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def sync(self):
+        """Writes the pending records right away, blocking."""
+        pending, self._pending = self._pending, []
+        if pending:
+            self.write(pending)
+
+    def reset(self):
+        """Replaces the journal by an empty file, once all its written changes are in the storage."""
+        temp_path = self.path + ".tmp"
+        with self._file_lock:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+            self._file.close()
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    async def _sync_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._pending_event.wait()
+            # Group commit: the changes of the next few ms share the fsync
+            await asyncio.sleep(self.fsync_delay)
+            self._pending_event.clear()
+            pending, self._pending = self._pending, []
+            try:
+                await loop.run_in_executor(self._executor, self.write, pending)
+            except OSError as e:
+                print(f"Error while writing the arena games journal: {e}")
+                self._pending = pending + self._pending
+                self._pending_event.set()
+
+    def start(self, executor=None):
+        """Start the background writer, must be called from within the running event loop."""
+        if self._task is None:
+            self._executor = executor
+            self._pending_event = asyncio.Event()
+            if self._pending:
+                self._pending_event.set()
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.sync()
+        self._file.close()
@@ -0,0 +1,80 @@
+import time
+from arena_storage import ArenaStorage
+from arena_records import STAT_FIELDS
+
+# Upgrades of the stored arena games, version -> async function(storage, riot_api, champion_index, match_cache).
+# A migration changes the data in place, the version it upgrades to is stored with the data (PRAGMA user_version)
+# so every migration runs once. Add a new one instead of wiping the games when the stored format changes.
+MIGRATIONS = {}
+
+
+def migration(version):
+    def register(function):
+        MIGRATIONS[version] = function
+        return function
+    return register
+
+
+def latest_version():
+    return max(MIGRATIONS)
+
+
+async def run_migrations(storage: ArenaStorage, riot_api, champion_index, match_cache):
+    """Brings the storage to the latest version, each migration in its own transaction."""
+    version = storage.get_schema_version()
+    for target in sorted(target for target in MIGRATIONS if target > version):
+        start = time.perf_counter()
+        try:
+            await MIGRATIONS[target](storage, riot_api, champion_index, match_cache)
+            storage.set_schema_version(target, commit=False)
+            storage.commit()
+        except Exception:
+            storage.rollback()
+            raise
+        print(f"Migrated arena games to version {target} in {time.perf_counter() - start:.2f}s")
+
+
+@migration(1)
+async def baseline(storage, riot_api, champion_index, match_cache):
+    # Databases from before the schema was versioned, the oldest ones don't store the puuid yet
+    storage.add_user_column("puuid")
+
+
+@migration(2)
+async def rederive_games(storage, riot_api, champion_index, match_cache):
+    """Re-parse the stored games from the raw matches in the match cache, so they get the current stats fields.
+
+    Games of which the match is not cached keep their stats, only their champion names are resolved
+    through the champion index (older games can have Riot's internal names such as MonkeyKing).
+    """
+    puuids = {user['user_key']: user['puuid'] for user in storage.get_users()}
+    for user_key, games in storage.get_all_games().items():
+        puuid = puuids.get(user_key)
+        for match_id, game in games.items():
+            match_details = match_cache.get(match_id) if puuid else None
+            rederived = await riot_api.parse_arena_game(match_details, puuid, champion_index) if match_details else None
+            if rederived:
+                games[match_id] = rederived
+            else:
+                game.champion = champion_index.resolve(game.champion, game.champion)
+                game.teammate_champion = champion_index.resolve(game.teammate_champion, game.teammate_champion)
+        storage.save_games(user_key, games, commit=False)
+    storage.clear_aggregates(commit=False)
+
+
+@migration(3)
+async def compact_game_stats(storage, riot_api, champion_index, match_cache):
+    """Store the stats of the games as arrays in the order of STAT_FIELDS instead of objects with the field names.
+
+    The field names are stored once, as the "stats" record header. The duplicated total_self_healing and
+    total_shielding stats are dropped, they have the same values as total_heal and total__healing_on_allies.
+    """
+    for user_key, games in storage.get_all_games().items():
+        storage.save_games(user_key, games, commit=False)
+    storage.set_record_header("stats", STAT_FIELDS, commit=False)
+
+
+@migration(4)
+async def add_sync_checkpoint(storage, riot_api, champion_index, match_cache):
+    # Progress of an interrupted sync, see ArenaGamesCache.sync_checkpoint
+    storage.add_user_column("sync_checkpoint")
@@ -0,0 +1,90 @@
+import sys
+from collections import namedtuple
+
+# Numeric stats of a game, also the order of the stats arrays in the storage
+STAT_FIELDS = (
+    "total_damage", "total_kills", "total_deaths", "total_assists", "total_heal", "total__healing_on_allies",
+    "total_shielding_on_teammate", "physical_damage_taken", "cc_duration", "highest_crit",
+    "ability_1_used", "ability_2_used", "ability_3_used", "ability_4_used",
+    "playerAugment1", "playerAugment2", "playerAugment3", "gold_earned", "largestKillingSpree"
+)
+# Older names of stats that Riot reports with the same value, they share the field
+STAT_ALIASES = {"total_self_healing": "total_heal", "total_shielding": "total__healing_on_allies"}
+
+
+def _intern(value):
+    # Champion and teammate names repeat in many games, every game then points to the same string
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class ArenaStats(namedtuple("ArenaStats", STAT_FIELDS, defaults=(0,) * len(STAT_FIELDS))):
+    """Stats of the player in a single arena game."""
+    __slots__ = ()
+
+    total_self_healing = property(lambda self: self.total_heal)
+    total_shielding = property(lambda self: self.total__healing_on_allies)
+
+    @classmethod
+    def from_dict(cls, data):
+        """From the old {stat: value} form, unknown stats are dropped and missing ones are 0."""
+        data = data or {}
+        return cls(*(data.get(field) or 0 for field in STAT_FIELDS))
+
+    @classmethod
+    def from_header(cls, header, values):
+        """From a stored array, of which header lists the fields."""
+        if header == STAT_FIELDS:
+            return cls._make(values)
+        return cls.from_dict(dict(zip(header, values)))
+
+    def to_dict(self):
+        data = dict(zip(STAT_FIELDS, self))
+        for alias, field in STAT_ALIASES.items():
+            data[alias] = data[field]
+        return data
+
+
+EMPTY_STATS = ArenaStats()
+
+
+class ArenaGame:
+    """A single arena game of a user."""
+    __slots__ = ("champion", "teammate_name", "teammate_champion", "timestamp", "place", "stats")
+
+    def __init__(self, champion, teammate_name, teammate_champion, timestamp, place, stats=EMPTY_STATS):
+        self.champion = _intern(champion)
+        self.teammate_name = _intern(teammate_name)
+        self.teammate_champion = _intern(teammate_champion)
+        self.timestamp = timestamp
+        self.place = place
+        self.stats = stats
+
+    def __repr__(self):
+        return f"ArenaGame({self.champion!r}, place={self.place}, timestamp={self.timestamp})"
+
+    @classmethod
+    def from_dict(cls, data):
+        """From the arena_games.json form."""
+        return cls(
+            data.get("champion"), data.get("teammate_name"), data.get("teammate_champion"),
+            data.get("timestamp"), data.get("place"), ArenaStats.from_dict(data.get("stats"))
+        )
+
+    def to_dict(self):
+        return {
+            "champion": self.champion,
+            "teammate_name": self.teammate_name,
+            "teammate_champion": self.teammate_champion,
+            "timestamp": self.timestamp,
+            "place": self.place,
+            "stats": self.stats.to_dict()
+        }
+
+    # Compact form, a JSON array with the stats in the order of STAT_FIELDS
+    @classmethod
+    def from_row(cls, row):
+        champion, teammate_name, teammate_champion, timestamp, place, stats = row
+        return cls(champion, teammate_name, teammate_champion, timestamp, place, ArenaStats._make(stats))
+
+    def to_row(self):
+        return [self.champion, self.teammate_name, self.teammate_champion, self.timestamp, self.place, list(self.stats)]
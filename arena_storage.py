@@ -0,0 +1,232 @@
+import os, json
+import sqlite3
+from arena_records import ArenaGame, ArenaStats, EMPTY_STATS, STAT_FIELDS
+
+DB_FILENAME = "arena_games.db"
+LEGACY_GAMES_FILENAME = "arena_games.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_key TEXT PRIMARY KEY,
+    name TEXT,
+    summoner_name TEXT,
+    summoner_tagline TEXT,
+    latest_update INTEGER,
+    puuid TEXT,
+    sync_checkpoint TEXT
+);
+
+CREATE TABLE IF NOT EXISTS games (
+    user_key TEXT NOT NULL,
+    match_id TEXT NOT NULL,
+    champion TEXT,
+    teammate_name TEXT,
+    teammate_champion TEXT,
+    timestamp INTEGER,
+    place INTEGER,
+    stats TEXT,
+    PRIMARY KEY (user_key, match_id)
+);
+CREATE INDEX IF NOT EXISTS idx_games_user_place ON games (user_key, place);
+CREATE INDEX IF NOT EXISTS idx_games_user_champion ON games (user_key, champion);
+CREATE INDEX IF NOT EXISTS idx_games_user_timestamp ON games (user_key, timestamp);
+
+CREATE TABLE IF NOT EXISTS aggregates (
+    user_key TEXT PRIMARY KEY,
+    data TEXT
+);
+
+-- Field names of the arrays stored in other tables, e.g. the stats of the games
+CREATE TABLE IF NOT EXISTS record_headers (
+    name TEXT PRIMARY KEY,
+    fields TEXT
+);
+
+CREATE TABLE IF NOT EXISTS manual_wins (
+    user_key TEXT NOT NULL,
+    champion TEXT NOT NULL,
+    timestamp TEXT,
+    PRIMARY KEY (user_key, champion)
+);
+"""
+
+USER_FIELDS = ("name", "summoner_name", "summoner_tagline", "latest_update", "puuid", "sync_checkpoint")
+GAME_COLUMNS = "match_id, champion, teammate_name, teammate_champion, timestamp, place, stats"
+
+
+def _row_to_game(row, stats_header=STAT_FIELDS):
+    stats = json.loads(row["stats"]) if row["stats"] else None
+    if not stats:
+        stats = EMPTY_STATS
+    elif isinstance(stats, dict):
+        # Stored as an object, before migration 3
+        stats = ArenaStats.from_dict(stats)
+    else:
+        stats = ArenaStats.from_header(stats_header, stats)
+    return ArenaGame(row["champion"], row["teammate_name"], row["teammate_champion"], row["timestamp"], row["place"], stats)
+
+
+class ArenaStorage:
+    """SQLite backed store for arena games, one row per game per user."""
+
+    def __init__(self, path=DB_FILENAME):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        # Games are always written with the current STAT_FIELDS, a migration that changes them rewrites the games
+        self.stats_header = self.get_record_header("stats") or STAT_FIELDS
+
+    def add_user_column(self, field):
+        """For migrations of databases created before the field was added to SCHEMA, newer ones have it already."""
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(users)")}
+        if field not in columns:
+            self.conn.execute(f"ALTER TABLE users ADD COLUMN {field}")
+
+    def commit(self):
+        self.conn.commit()
+
+    # Schema version, see arena_migrations
+    def get_schema_version(self):
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def set_schema_version(self, version, commit=True):
+        self.conn.execute(f"PRAGMA user_version = {int(version)}")
+        if commit:
+            self.conn.commit()
+
+    def get_record_header(self, name):
+        row = self.conn.execute("SELECT fields FROM record_headers WHERE name = ?", (name,)).fetchone()
+        return tuple(json.loads(row["fields"])) if row else None
+
+    def set_record_header(self, name, fields, commit=True):
+        self.conn.execute("INSERT OR REPLACE INTO record_headers (name, fields) VALUES (?, ?)", (name, json.dumps(list(fields))))
+        if name == "stats":
+            self.stats_header = tuple(fields)
+        if commit:
+            self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+    # Users
+    def get_user(self, user_key):
+        row = self.conn.execute("SELECT * FROM users WHERE user_key = ?", (user_key,)).fetchone()
+        return dict(row) if row else None
+
+    def get_users(self):
+        return [dict(row) for row in self.conn.execute("SELECT * FROM users")]
+
+    def save_user(self, user_key, profile, commit=True):
+        """Write all profile fields of a user, including the ones that are None."""
+        values = [profile.get(key) for key in USER_FIELDS]
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO users (user_key, {', '.join(USER_FIELDS)}) VALUES (?{', ?' * len(USER_FIELDS)})",
+            (user_key, *values)
+        )
+        if commit:
+            self.conn.commit()
+
+    # Games
+    def get_games(self, user_key):
+        rows = self.conn.execute(f"SELECT {GAME_COLUMNS} FROM games WHERE user_key = ? ORDER BY timestamp", (user_key,))
+        return {row["match_id"]: _row_to_game(row, self.stats_header) for row in rows}
+
+    def get_all_games(self):
+        """All games grouped per user as {user_key: {match_id: game}}, in a single pass."""
+        all_games = {}
+        rows = self.conn.execute(f"SELECT user_key, {GAME_COLUMNS} FROM games ORDER BY user_key, timestamp")
+        for row in rows:
+            all_games.setdefault(row["user_key"], {})[row["match_id"]] = _row_to_game(row, self.stats_header)
+        return all_games
+
+    def save_games(self, user_key, games, commit=True):
+        """Insert or replace games given as {match_id: ArenaGame}."""
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO games (user_key, {GAME_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    user_key, match_id, game.champion, game.teammate_name, game.teammate_champion,
+                    game.timestamp, game.place, json.dumps(list(game.stats), separators=(",", ":"))
+                )
+                for match_id, game in games.items()
+            ]
+        )
+        if commit:
+            self.conn.commit()
+
+    # Per-user stat aggregates, stored as JSON
+    def get_aggregate(self, user_key):
+        row = self.conn.execute("SELECT data FROM aggregates WHERE user_key = ?", (user_key,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def get_all_aggregates(self):
+        return {row["user_key"]: json.loads(row["data"]) for row in self.conn.execute("SELECT user_key, data FROM aggregates")}
+
+    def clear_aggregates(self, commit=True):
+        # They are rebuilt from the games on the next load
+        self.conn.execute("DELETE FROM aggregates")
+        if commit:
+            self.conn.commit()
+
+    def save_aggregate(self, user_key, data, commit=True):
+        self.conn.execute("INSERT OR REPLACE INTO aggregates (user_key, data) VALUES (?, ?)", (user_key, json.dumps(data)))
+        if commit:
+            self.conn.commit()
+
+    # Manually added wins
+    def get_manual_wins(self, user_key):
+        rows = self.conn.execute("SELECT champion, timestamp FROM manual_wins WHERE user_key = ?", (user_key,))
+        return [dict(row) for row in rows]
+
+    def get_all_manual_wins(self):
+        all_wins = {}
+        for row in self.conn.execute("SELECT user_key, champion, timestamp FROM manual_wins"):
+            all_wins.setdefault(row["user_key"], []).append({"champion": row["champion"], "timestamp": row["timestamp"]})
+        return all_wins
+
+    def replace_manual_wins(self, user_key, wins, commit=True):
+        self.conn.execute("DELETE FROM manual_wins WHERE user_key = ?", (user_key,))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO manual_wins (user_key, champion, timestamp) VALUES (?, ?, ?)",
+            [(user_key, win["champion"], win.get("timestamp")) for win in wins]
+        )
+        if commit:
+            self.conn.commit()
+
+    # Migration from the old arena_games.json layout
+    def migrate_from_json(self, json_path=LEGACY_GAMES_FILENAME):
+        """One-shot import of the legacy JSON store. The file is renamed afterwards so it only runs once."""
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "r") as file:
+                legacy_data = json.load(file)
+        except json.JSONDecodeError:
+            legacy_data = {}
+
+        imported = 0
+        with self.conn:
+            for user_key, info in legacy_data.items():
+                fields = {key: value for key, value in info.items() if key in USER_FIELDS and value is not None}
+                self.conn.execute("INSERT OR IGNORE INTO users (user_key) VALUES (?)", (user_key,))
+                if fields:
+                    assignments = ", ".join(f"{key} = ?" for key in fields)
+                    self.conn.execute(f"UPDATE users SET {assignments} WHERE user_key = ?", (*fields.values(), user_key))
+                games = {match_id: ArenaGame.from_dict(game) for match_id, game in (info.get("arena_games") or {}).items()}
+                self.save_games(user_key, games, commit=False)
+                imported += len(games)
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO manual_wins (user_key, champion, timestamp) VALUES (?, ?, ?)",
+                    [(user_key, win["champion"], win.get("timestamp")) for win in info.get("wins", [])]
+                )
+
+        os.replace(json_path, json_path + ".migrated")
+        print(f"Migrated {len(legacy_data)} users and {imported} games from {json_path} to {self.path}")
+        return imported
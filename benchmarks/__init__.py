@@ -0,0 +1,7 @@
+"""Benchmarks of the bot's hot paths on generated arena data.
+
+Run from the repository root, results are written as JSON:
+
+    python -m benchmarks.run --sizes 10 1000 10000 --output results.json
+    python -m benchmarks.run --baseline results.json  # compare against an earlier run
+"""
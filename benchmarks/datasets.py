@@ -0,0 +1,90 @@
+import json
+import random
+from arena_records import ArenaGame
+
+# Dataset sizes in users
+SIZES = (10, 1000, 10000, 100000)
+
+MEAN_GAMES_PER_USER = 20  # most users play a handful of games, a few play hundreds
+MAX_GAMES_PER_USER = 400
+WIN_RATE = 0.15  # a bit above 1 in 8, teams that sync their games are the better ones
+ARENA_START = 1740787261000  # ms, first game timestamp
+GAME_INTERVAL = 30 * 60 * 1000  # ms, at most between two games of a user
+
+
+def _stats(rng, place):
+    # Roughly the ranges seen in real arena games, better placements play more rounds
+    rounds = 9 - place
+    heal = rng.randint(0, 3000) * rounds
+    healing_on_allies = rng.randint(0, 1000) * rounds
+    return {
+        "total_damage": rng.randint(2000, 9000) * rounds,
+        "total_kills": rng.randint(0, 4) * rounds,
+        "total_deaths": rng.randint(1, 3) + rounds,
+        "total_assists": rng.randint(0, 3) * rounds,
+        # Riot reports these pairs with the same value
+        "total_heal": heal,
+        "total_self_healing": heal,
+        "total__healing_on_allies": healing_on_allies,
+        "total_shielding": healing_on_allies,
+        "total_shielding_on_teammate": rng.randint(0, 1500) * rounds,
+        "physical_damage_taken": rng.randint(1000, 6000) * rounds,
+        "cc_duration": rng.randint(0, 40) * rounds,
+        "highest_crit": rng.choice((0, 0, rng.randint(200, 3000))),
+        "ability_1_used": rng.randint(5, 40) * rounds,
+        "ability_2_used": rng.randint(3, 30) * rounds,
+        "ability_3_used": rng.randint(3, 30) * rounds,
+        "ability_4_used": rng.randint(0, 8) * rounds,
+        "playerAugment1": rng.randint(1, 400),
+        "playerAugment2": rng.randint(1, 400),
+        "playerAugment3": rng.randint(1, 400),
+        "gold_earned": rng.randint(1500, 3500) * rounds,
+        "largestKillingSpree": rng.randint(0, 6)
+    }
+
+
+def generate_users(user_count, champions, seed=0):
+    """Yields (user_key, user) in the arena_games.json format. The same arguments always give the same data."""
+    rng = random.Random(seed)
+    for index in range(user_count):
+        user_key = str(100000000000000000 + index)
+        game_count = min(int(rng.expovariate(1 / MEAN_GAMES_PER_USER)), MAX_GAMES_PER_USER)
+        timestamp = ARENA_START + rng.randrange(GAME_INTERVAL)
+        games = {}
+        for game_index in range(game_count):
+            timestamp += rng.randrange(1, GAME_INTERVAL)
+            place = 1 if rng.random() < WIN_RATE else rng.randint(2, 8)
+            games[f"EUW1_{index}_{game_index}"] = {
+                "champion": rng.choice(champions),
+                "teammate_name": f"teammate{rng.randrange(user_count * 4)}",
+                "teammate_champion": rng.choice(champions),
+                "timestamp": timestamp,
+                "place": place,
+                "stats": _stats(rng, place)
+            }
+        yield user_key, {
+            "name": f"user{index}",
+            "summoner_name": f"summoner{index}",
+            "summoner_tagline": "EUW",
+            "latest_update": timestamp,
+            "puuid": f"puuid-{index}",
+            "arena_games": games,
+            "wins": []
+        }
+
+
+def write_json(file_path, users):
+    """Writes generated users as an arena_games.json file."""
+    with open(file_path, "w") as file:
+        json.dump(dict(users), file)
+
+
+def write_storage(storage, users, batch_size=1000):
+    """Writes generated users straight to an ArenaStorage, without holding them all in memory."""
+    for count, (user_key, user) in enumerate(users, 1):
+        storage.save_user(user_key, user, commit=False)
+        games = {match_id: ArenaGame.from_dict(game) for match_id, game in user["arena_games"].items()}
+        storage.save_games(user_key, games, commit=False)
+        if count % batch_size == 0:
+            storage.commit()
+    storage.commit()
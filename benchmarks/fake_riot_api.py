@@ -0,0 +1,295 @@
+"""A local stand-in for the Riot account-v1 and match-v5 endpoints the bot uses.
+
+Serves generated arena (CHERRY) and other matches for a set of generated players, with Riot's
+rate limit headers, 429s with Retry-After once a limit is exceeded, bursts of 5xx errors and
+configurable latency. Point CustomRiotAPI (base_url) or the bot (RIOT_API_BASE_URL in .env) to it:
+
+    python -m benchmarks.fake_riot_api --port 8080 --players 100
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from aiohttp import web
+from riot_rate_limiter import method_key
+
+ARENA_START = 1740787261000  # ms, same as the sync in summoner_wins
+MATCH_INTERVAL = 20 * 60 * 1000  # ms, between two matches of a player
+ARENA_QUEUES = (1700, 1710)
+OTHER_QUEUES = (420, 450)  # ranked solo and ARAM
+PARTICIPANTS = 16  # arena: 8 teams of 2
+DEV_APP_LIMITS = ((20, 1), (100, 120))
+METHOD_LIMITS = {
+    "/riot/account/v1/accounts/by-riot-id/{}/{}": ((1000, 60),),
+    "/lol/match/v5/matches/by-puuid/{}/ids": ((2000, 10),),
+    "/lol/match/v5/matches/{matchId}": ((2000, 10),),
+}
+PLATFORM = "EUW1"
+
+
+def riot_champion_name(name):
+    # championName as Riot sends it, e.g. Kai'Sa -> KaiSa, Dr. Mundo -> DrMundo
+    return name.replace(" ", "").replace("'", "").replace(".", "").replace("&Willump", "")
+
+
+class RateWindow:
+    """Riot's fixed windows: the window starts at the first request and resets after `seconds`."""
+
+    def __init__(self, limit, seconds):
+        self.limit = limit
+        self.seconds = seconds
+        self.start = 0
+        self.count = 0
+
+    def retry_after(self, now):
+        """Seconds until the window has room again, 0 when there is room now."""
+        if now - self.start >= self.seconds:
+            self.start, self.count = now, 0
+        return 0 if self.count < self.limit else self.start + self.seconds - now
+
+    def header(self):
+        return f"{self.limit}:{self.seconds}", f"{self.count}:{self.seconds}"
+
+
+class FakeRiotAPI:
+    def __init__(self, players=100, matches_per_player=50, arena_share=0.8, shared_share=0.3, latency=0.02,
+                 latency_jitter=0.01, app_limits=DEV_APP_LIMITS, method_limits=METHOD_LIMITS, error_rate=0.0,
+                 error_burst=5, seed=0, champions=None):
+        """
+        players: generated accounts, named summoner{i}#EUW
+        arena_share: part of the matches that are arena matches, the rest are other queues
+        shared_share: part of the matches in which another generated player takes part, e.g. a duo partner
+        latency, latency_jitter: seconds before every response
+        error_rate: chance that a request starts a burst of error_burst 503 responses
+        """
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_burst = error_burst
+        self.app_windows = [RateWindow(limit, seconds) for limit, seconds in app_limits]
+        self.method_windows = {method: [RateWindow(limit, seconds) for limit, seconds in limits] for method, limits in method_limits.items()}
+        self.champions = [riot_champion_name(champion) for champion in champions or ["Ahri", "Zed", "Lux", "Jinx"]]
+        self.errors_left = 0
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "not_found": 0, "ok": 0}
+
+        self.players = [
+            {"gameName": f"summoner{index}", "tagLine": "EUW", "puuid": f"fake-puuid-{index}"} for index in range(players)
+        ]
+        self.by_riot_id = {(player["gameName"].lower(), player["tagLine"].lower()): player for player in self.players}
+        # match number -> (gameCreation, queueId, puuids of generated players), the payload is generated on request
+        self.matches = {}
+        self.match_ids_by_puuid = {player["puuid"]: [] for player in self.players}
+        for index, player in enumerate(self.players):
+            timestamp = ARENA_START + self.rng.randrange(MATCH_INTERVAL)
+            for _ in range(matches_per_player):
+                timestamp += self.rng.randrange(1, MATCH_INTERVAL)
+                arena = self.rng.random() < arena_share
+                queue = self.rng.choice(ARENA_QUEUES if arena else OTHER_QUEUES)
+                puuids = [player["puuid"]]
+                if players > 1 and self.rng.random() < shared_share:
+                    other = self.players[self.rng.randrange(players)]["puuid"]
+                    if other != player["puuid"]:
+                        puuids.append(other)
+                number = len(self.matches)
+                self.matches[number] = (timestamp, queue, puuids)
+                for puuid in puuids:
+                    self.match_ids_by_puuid[puuid].append(number)
+        for numbers in self.match_ids_by_puuid.values():
+            numbers.sort(key=lambda number: self.matches[number][0], reverse=True)  # newest first, like Riot
+        self.runner = None
+
+    # Data
+    def match_payload(self, number):
+        timestamp, queue, puuids = self.matches[number]
+        rng = random.Random(self.seed * 1000003 + number)
+        arena = queue in ARENA_QUEUES
+        puuids = puuids + [f"other-{number}-{index}" for index in range(PARTICIPANTS - len(puuids))]
+        placements = list(range(1, 9))
+        rng.shuffle(placements)
+        participants = []
+        for index, puuid in enumerate(puuids):
+            subteam = index // 2 + 1 if arena else index % 2 + 1
+            rounds = 9 - placements[subteam - 1] if arena else 5
+            participants.append({
+                "puuid": puuid,
+                "riotIdGameName": puuid.replace("fake-puuid-", "summoner"),
+                "championName": rng.choice(self.champions),
+                "placement": placements[subteam - 1] if arena else 0,
+                "playerSubteamId": subteam if arena else 0,
+                "teamId": subteam,
+                "totalDamageDealtToChampions": rng.randint(2000, 9000) * rounds,
+                "kills": rng.randint(0, 4) * rounds,
+                "deaths": rng.randint(1, 3) + rounds,
+                "assists": rng.randint(0, 3) * rounds,
+                "totalHeal": rng.randint(0, 3000) * rounds,
+                "totalHealsOnTeammates": rng.randint(0, 1000) * rounds,
+                "totalDamageShieldedOnTeammates": rng.randint(0, 1500) * rounds,
+                "physicalDamageTaken": rng.randint(1000, 6000) * rounds,
+                "totalTimeCCDealt": rng.randint(0, 40) * rounds,
+                "largestCriticalStrike": rng.choice((0, rng.randint(200, 3000))),
+                "spell1Casts": rng.randint(5, 40) * rounds,
+                "spell2Casts": rng.randint(3, 30) * rounds,
+                "spell3Casts": rng.randint(3, 30) * rounds,
+                "spell4Casts": rng.randint(0, 8) * rounds,
+                "playerAugment1": rng.randint(1, 400),
+                "playerAugment2": rng.randint(1, 400),
+                "playerAugment3": rng.randint(1, 400),
+                "goldEarned": rng.randint(1500, 3500) * rounds,
+                "largestKillingSpree": rng.randint(0, 6)
+            })
+        return {
+            "metadata": {"matchId": f"{PLATFORM}_{number}", "participants": puuids},
+            "info": {
+                "gameCreation": timestamp,
+                "gameMode": "CHERRY" if arena else ("ARAM" if queue == 450 else "CLASSIC"),
+                "queueId": queue,
+                "participants": participants
+            }
+        }
+
+    # Handlers
+    async def account(self, request):
+        player = self.by_riot_id.get((request.match_info["game_name"].lower(), request.match_info["tag_line"].lower()))
+        return player
+
+    async def match_ids(self, request):
+        numbers = self.match_ids_by_puuid.get(request.match_info["puuid"])
+        if numbers is None:
+            return []
+        query = request.query
+        if "queue" in query:
+            numbers = [number for number in numbers if self.matches[number][1] == int(query["queue"])]
+        if "startTime" in query:
+            numbers = [number for number in numbers if self.matches[number][0] >= int(query["startTime"]) * 1000]
+        if "endTime" in query:
+            numbers = [number for number in numbers if self.matches[number][0] <= int(query["endTime"]) * 1000 + 999]
+        start, count = int(query.get("start", 0)), min(int(query.get("count", 20)), 100)
+        return [f"{PLATFORM}_{number}" for number in numbers[start:start + count]]
+
+    async def match(self, request):
+        platform, _, number = request.match_info["match_id"].partition("_")
+        if platform != PLATFORM or not number.isdigit() or int(number) not in self.matches:
+            return None
+        return self.match_payload(int(number))
+
+    def _rate_limit(self, method):
+        """Counts the request, returns a 429 response when a window is full."""
+        now = time.monotonic()
+        method_windows = self.method_windows.get(method, [])
+        for limit_type, windows in (("application", self.app_windows), ("method", method_windows)):
+            retry_after = max((window.retry_after(now) for window in windows), default=0)
+            if retry_after:
+                return limit_type, retry_after
+        for window in self.app_windows + method_windows:
+            window.count += 1
+        return None
+
+    def _rate_limit_headers(self, method):
+        headers = {}
+        for prefix, windows in (("X-App", self.app_windows), ("X-Method", self.method_windows.get(method, []))):
+            if windows:
+                limits, counts = zip(*(window.header() for window in windows))
+                headers[f"{prefix}-Rate-Limit"] = ",".join(limits)
+                headers[f"{prefix}-Rate-Limit-Count"] = ",".join(counts)
+        return headers
+
+    def _handle(self, handler):
+        async def handle(request):
+            self.stats["requests"] += 1
+            await asyncio.sleep(max(0, self.latency + self.rng.uniform(-self.latency_jitter, self.latency_jitter)))
+
+            if not self.errors_left and self.error_rate and self.rng.random() < self.error_rate:
+                self.errors_left = self.error_burst
+            if self.errors_left:
+                self.errors_left -= 1
+                self.stats["errors"] += 1
+                return web.json_response({"status": {"message": "Service unavailable", "status_code": 503}}, status=503)
+
+            method = method_key(request.path)
+            limited = self._rate_limit(method)
+            headers = self._rate_limit_headers(method)
+            if limited:
+                limit_type, retry_after = limited
+                self.stats["rate_limited"] += 1
+                headers.update({"Retry-After": str(math.ceil(retry_after)), "X-Rate-Limit-Type": limit_type})
+                return web.json_response({"status": {"message": "Rate limit exceeded", "status_code": 429}}, status=429, headers=headers)
+
+            body = await handler(request)
+            if body is None:
+                self.stats["not_found"] += 1
+                return web.json_response({"status": {"message": "Data not found", "status_code": 404}}, status=404, headers=headers)
+            self.stats["ok"] += 1
+            return web.json_response(body, headers=headers)
+        return handle
+
+    def application(self):
+        app = web.Application()
+        app.router.add_get("/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}", self._handle(self.account))
+        app.router.add_get("/lol/match/v5/matches/by-puuid/{puuid}/ids", self._handle(self.match_ids))
+        app.router.add_get("/lol/match/v5/matches/{match_id}", self._handle(self.match))
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Starts serving, returns the base url. Port 0 picks a free port."""
+        self.runner = web.AppRunner(self.application())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+def parse_limits(value):
+    """'20:1,100:120' -> ((20, 1), (100, 120))"""
+    return tuple(tuple(int(number) for number in part.split(":")) for part in value.split(","))
+
+
+def load_champions():
+    file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lol_champions.json")
+    with open(file_path) as file:
+        return json.load(file)["champions"]
+
+
+async def serve(args):
+    server = FakeRiotAPI(
+        players=args.players, matches_per_player=args.matches, latency=args.latency, app_limits=parse_limits(args.app_limits),
+        error_rate=args.error_rate, seed=args.seed, champions=load_champions()
+    )
+    base_url = await server.start(args.host, args.port)
+    print(f"Fake Riot API on {base_url}, players summoner0#EUW up to summoner{args.players - 1}#EUW")
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(server.stats)
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Riot API endpoints the bot uses.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--matches", type=int, default=50, help="matches per player")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds")
+    parser.add_argument("--app-limits", default="20:1,100:120", help="requests:seconds,... like X-App-Rate-Limit")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="chance that a request starts a burst of 503s")
+    parser.add_argument("--seed", type=int, default=0)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+class FakeMember:
+    def __init__(self, member_id, name):
+        self.id = member_id
+        self.name = name
+        self.guild = None
+
+
+class FakeGuild:
+    def __init__(self, guild_id, members):
+        self.id = guild_id
+        self.members = list(members)
+        self._by_id = {member.id: member for member in self.members}
+        for member in self.members:
+            member.guild = self
+
+    def get_member(self, member_id):
+        return self._by_id.get(member_id)
+
+
+class FakeResponse:
+    """Accepts the responses the commands send, without talking to Discord."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, *args, **kwargs):
+        self.sent += 1
+
+    async def edit_message(self, *args, **kwargs):
+        self.sent += 1
+
+    async def defer(self, *args, **kwargs):
+        pass
+
+
+class FakeInteraction:
+    def __init__(self, user, guild):
+        self.user = user
+        self.guild = guild
+        self.response = FakeResponse()
+        self.followup = self.response
+
+
+def fake_guild(user_keys, guild_id=1, extra_members=0):
+    """A guild with a member for every user key, plus members that never registered with the bot."""
+    members = [FakeMember(int(user_key), f"user{index}") for index, user_key in enumerate(user_keys)]
+    members += [FakeMember(900000000000000000 + index, f"member{index}") for index in range(extra_members)]
+    return FakeGuild(guild_id, members)
@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPEAT = 5
+SAMPLE_USERS = 1000  # per-user benchmarks run over this many users
+LEGACY_IMPORT_MAX_USERS = 10000  # the legacy import loads the whole JSON file in memory
+UNREGISTERED_MEMBERS = 1000  # members of the fake guild that never used the bot
+
+
+def summarize(timings):
+    """Timings in ms."""
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "runs": len(timings)
+    }
+
+
+def measure(function, arguments=(None,), repeat=REPEAT):
+    """Calls function once for every argument, repeat times. Returns the summary in ms per call."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for argument in arguments:
+            function(argument)
+        timings.append((time.perf_counter() - start) * 1000 / len(arguments))
+    return summarize(timings)
+
+
+async def measure_async(function, arguments=(None,), repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for argument in arguments:
+            await function(argument)
+        timings.append((time.perf_counter() - start) * 1000 / len(arguments))
+    return summarize(timings)
+
+
+async def run_size(user_count, seed):
+    """Benchmarks a single dataset size. Imports main, so it has to run in its own process and directory."""
+    work_dir = tempfile.mkdtemp(prefix="arena-benchmark-")
+    try:
+        shutil.copy(os.path.join(REPO_ROOT, "lol_champions.json"), work_dir)
+        os.chdir(work_dir)
+        sys.path.insert(0, REPO_ROOT)
+
+        import main
+        from arena_cache import ArenaGamesCache
+        from arena_storage import ArenaStorage
+        from benchmarks.datasets import generate_users, write_json, write_storage
+        from benchmarks.fakes import FakeInteraction, fake_guild
+
+        results = {}
+        if user_count <= LEGACY_IMPORT_MAX_USERS:
+            write_json("legacy.json", generate_users(user_count, main.champion_index.champions, seed))
+
+            timings = []
+            for run in range(3):
+                # migrate_from_json renames the file, every run imports a fresh copy into a fresh database
+                shutil.copy("legacy.json", f"arena_games_{run}.json")
+                start = time.perf_counter()
+                ArenaStorage(f"import_{run}.db").migrate_from_json(f"arena_games_{run}.json")
+                timings.append((time.perf_counter() - start) * 1000)
+            results["legacy_json_import"] = summarize(timings)
+
+        write_storage(main.storage, generate_users(user_count, main.champion_index.champions, seed))
+        # Stores the aggregates, so the loads below measure the normal startup and not a rebuild
+        main.games_cache.load_all()
+        main.games_cache.flush()
+        game_count = sum(len(user_data.games) for user_data in main.games_cache.users())
+
+        results["load_arena_games"] = measure(
+            lambda _: ArenaGamesCache(main.storage, main.champion_index).load_all(), repeat=3
+        )
+
+        user_keys = [user_data.user_key for user_data in main.games_cache.users()]
+        sample = user_keys[::max(1, len(user_keys) // SAMPLE_USERS)][:SAMPLE_USERS]
+        results["get_wins_as_dict"] = measure(main.get_wins_as_dict, sample)
+        wins = [main.get_wins_as_dict(user_key) for user_key in sample]
+        results["get_first_wins_as_dict"] = measure(main.get_first_wins_as_dict, wins)
+        results["arena_stats_to_description"] = await measure_async(main.arena_stats_to_description, sample)
+
+        guild = fake_guild(user_keys, extra_members=UNREGISTERED_MEMBERS)
+        results["guild_index_build"] = measure(
+            lambda _: main.guild_index.add_guild(guild.id, [member.id for member in guild.members]), repeat=3
+        )
+        members = [guild.get_member(int(user_key)) for user_key in sample]
+        results["create_leaderboard"] = await measure_async(
+            lambda member: main.create_leaderboard(FakeInteraction(member, guild)), members
+        )
+        results["generate_champions"] = await measure_async(
+            lambda member: main.generate_champions(FakeInteraction(member, guild)), members
+        )
+        teammates = members[1:] + members[:1]
+        results["generate_champions_with_teammate"] = await measure_async(
+            lambda pair: main.generate_champions(FakeInteraction(pair[0], guild), teammate_name=pair[1].name),
+            list(zip(members, teammates))
+        )
+        return {"users": user_count, "games": game_count, "benchmarks": results}
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline):
+    print(f"\n{'benchmark':<36}{'users':>8}{'median ms':>12}{'baseline':>12}{'ratio':>8}")
+    for size, size_results in results["sizes"].items():
+        baseline_benchmarks = baseline.get("sizes", {}).get(size, {}).get("benchmarks", {})
+        for name, summary in size_results["benchmarks"].items():
+            base = baseline_benchmarks.get(name)
+            base_median = f"{base['median']:.4f}" if base else "-"
+            ratio = f"{summary['median'] / base['median']:.2f}x" if base and base['median'] else "-"
+            print(f"{name:<36}{size:>8}{summary['median']:>12.4f}{base_median:>12}{ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the bot's hot paths on generated arena data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="dataset sizes in users, up to 100000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        result = asyncio.run(run_size(args.worker, args.seed))
+        with open(args.worker_output, "w") as file:
+            json.dump(result, file)
+        return
+
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "sizes": {}
+    }
+    for size in args.sizes:
+        print(f"Benchmarking {size} users...")
+        # Every size runs in a fresh process, main keeps its state in module globals
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as worker_output:
+            worker_output_path = worker_output.name
+        try:
+            process = subprocess.run(
+                [sys.executable, "-m", "benchmarks.run", "--worker", str(size), "--seed", str(args.seed),
+                 "--worker-output", worker_output_path],
+                cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+            )
+            if process.returncode != 0:
+                print(process.stdout)
+                sys.exit(f"Benchmark of {size} users failed")
+            with open(worker_output_path) as file:
+                results["sizes"][str(size)] = json.load(file)
+        finally:
+            os.remove(worker_output_path)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(results, json.load(file))
+    else:
+        compare(results, {})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""End-to-end sync benchmark: many users syncing at the same time against the local fake Riot API.
+
+    python -m benchmarks.sync_load --users 50 --matches 40 --error-rate 0.01 --output sync_results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arena_cache import ArenaGamesCache
+from arena_storage import ArenaStorage
+from champion_index import ChampionIndex
+from match_cache import MatchCache
+from summoner_wins import CustomRiotAPI
+from benchmarks.fake_riot_api import FakeRiotAPI, load_champions, parse_limits
+
+
+async def run(users, matches, concurrent_syncs, latency, error_rate, app_limits, seed):
+    champions = load_champions()
+    champion_index = ChampionIndex(champions)
+    server = FakeRiotAPI(
+        players=users, matches_per_player=matches, latency=latency, error_rate=error_rate,
+        app_limits=app_limits, seed=seed, champions=champions
+    )
+    base_url = await server.start()
+    work_dir = tempfile.mkdtemp(prefix="arena-sync-load-")
+    storage = ArenaStorage(os.path.join(work_dir, "arena_games.db"))
+    games_cache = ArenaGamesCache(storage, champion_index)
+    match_cache = MatchCache(os.path.join(work_dir, "match_cache"))
+    match_cache.load()
+    riot_api = CustomRiotAPI("fake-api-key", games_cache, match_cache, base_url=base_url)
+    await riot_api.start()
+
+    semaphore = asyncio.Semaphore(concurrent_syncs)
+    sync_times = []
+
+    async def sync(player):
+        async with semaphore:
+            start = time.perf_counter()
+            puuid = await riot_api.get_puuid(player["gameName"], player["tagLine"])
+            await riot_api.update_arena_games(
+                None, player["puuid"], player["gameName"], puuid, champion_index, None, player["gameName"], player["tagLine"]
+            )
+            sync_times.append(time.perf_counter() - start)
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(sync(player) for player in server.players))
+        elapsed = time.perf_counter() - start
+        games_cache.flush()
+    finally:
+        await riot_api.close()
+        await server.close()
+        storage.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    arena_matches = sum(1 for _, queue, _ in server.matches.values() if queue in (1700, 1710))
+    sync_times.sort()
+    return {
+        "users": users,
+        "matches_per_user": matches,
+        "concurrent_syncs": concurrent_syncs,
+        "latency": latency,
+        "error_rate": error_rate,
+        "seconds": elapsed,
+        "arena_matches": arena_matches,
+        "matches_downloaded": len(match_cache),
+        "matches_per_second": len(match_cache) / elapsed if elapsed else 0,
+        "games_stored": sum(len(user_data.games) for user_data in games_cache.users()),
+        "sync_seconds_median": sync_times[len(sync_times) // 2] if sync_times else 0,
+        "sync_seconds_max": sync_times[-1] if sync_times else 0,
+        "client_requests": riot_api.request_count,
+        "server": server.stats
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks update_arena_games against the local fake Riot API.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--matches", type=int, default=40, help="matches per user")
+    parser.add_argument("--concurrent-syncs", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="chance that a request starts a burst of 503s")
+    parser.add_argument("--app-limits", default="500:10,30000:600", help="requests:seconds,..., the default is a production key")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(
+        args.users, args.matches, args.concurrent_syncs, args.latency, args.error_rate, parse_limits(args.app_limits), args.seed
+    ))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
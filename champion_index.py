@@ -0,0 +1,165 @@
+import json
+import random
+
+# Names the Riot API uses in championName that differ from the display name
+RIOT_ALIASES = {
+    "MonkeyKing": "Wukong",
+    "Nunu": "Nunu & Willump",
+    "Renata": "Renata Glasc",
+}
+MAX_TYPO_DISTANCE = 2
+RANDOM_PICK_ATTEMPTS = 8  # random draws before falling back to walking the set bits
+
+
+def normalize_name(name):
+    return name.lower().replace("'", "").replace(" ", "").replace(".", "").replace("&", "")
+
+
+def url_name(name):
+    # Champion name as used in blitz.gg urls
+    return name.lower().replace("'", "").replace(" ", "").replace(".", "")
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """Burkhard-Keller tree over normalized names, finds all names within an edit distance."""
+
+    def __init__(self):
+        self.root = None  # (word, {distance: child})
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = levenshtein(word, node[0])
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = (word, {})
+                return
+            node = node[1][distance]
+
+    def search(self, word, max_distance):
+        """Returns [(distance, word)] sorted on distance."""
+        results = []
+        nodes = [self.root] if self.root else []
+        while nodes:
+            node_word, children = nodes.pop()
+            distance = levenshtein(word, node_word)
+            if distance <= max_distance:
+                results.append((distance, node_word))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    nodes.append(child)
+        return sorted(results)
+
+
+class ChampionIndex:
+    """Champion name lookups: exact on the normalized name, by prefix and typo tolerant."""
+
+    def __init__(self, champions):
+        self.champions = list(champions)
+        self.positions = {champion: position for position, champion in enumerate(self.champions)}
+        self.all_mask = (1 << len(self.champions)) - 1
+        self.by_key = {normalize_name(champion): champion for champion in self.champions}
+        for alias, champion in RIOT_ALIASES.items():
+            if champion in self.champions:
+                self.by_key.setdefault(normalize_name(alias), champion)
+
+        self.trie = {}
+        self.bk_tree = BKTree()
+        for key in self.by_key:
+            node = self.trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[""] = self.by_key[key]  # "" marks the end of a name
+            self.bk_tree.add(key)
+
+    @classmethod
+    def from_file(cls, file_path="lol_champions.json"):
+        with open(file_path, "r") as file:
+            return cls(json.load(file)["champions"])
+
+    def resolve(self, name, default=None):
+        """The champion with this name, ignoring case, spaces and punctuation."""
+        return self.by_key.get(normalize_name(name), default) if name else default
+
+    def starting_with(self, prefix, limit=25):
+        node = self.trie
+        for char in normalize_name(prefix):
+            node = node.get(char)
+            if node is None:
+                return []
+        found = []
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            for char, child in node.items():
+                if char == "":
+                    found.append(child)
+                else:
+                    nodes.append(child)
+        # Aliases can point to a champion that is also found by its own name
+        return sorted(set(found))[:limit]
+
+    def _fuzzy(self, name):
+        key = normalize_name(name)
+        # Short names allow fewer typos, otherwise everything of 2 letters matches
+        return self.bk_tree.search(key, min(MAX_TYPO_DISTANCE, len(key) // 2))
+
+    def closest(self, name):
+        """Best typo tolerant match, None when nothing is close enough."""
+        matches = self._fuzzy(name)
+        return self.by_key[matches[0][1]] if matches else None
+
+    def suggest(self, query, limit=25):
+        """Suggestions for autocomplete: prefix matches first, then names within a few typos."""
+        if not query:
+            return self.champions[:limit]
+        suggestions = self.starting_with(query, limit)
+        if len(suggestions) < limit:
+            for _, key in self._fuzzy(query):
+                champion = self.by_key[key]
+                if champion not in suggestions:
+                    suggestions.append(champion)
+        return suggestions[:limit]
+
+    # Champion sets as bitmasks, bit i stands for self.champions[i]
+    def bit(self, champion):
+        position = self.positions.get(champion)
+        return 0 if position is None else 1 << position
+
+    def mask(self, champions):
+        mask = 0
+        for champion in champions:
+            mask |= self.bit(champion)
+        return mask
+
+    def champions_in(self, mask):
+        return [champion for position, champion in enumerate(self.champions) if mask >> position & 1]
+
+    def random_champion(self, mask):
+        """A random champion from the mask, None for an empty mask."""
+        mask &= self.all_mask
+        if not mask:
+            return None
+        # Most users have won with only a few champions, so a random draw almost always hits
+        for _ in range(RANDOM_PICK_ATTEMPTS):
+            position = random.randrange(len(self.champions))
+            if mask >> position & 1:
+                return self.champions[position]
+        # Otherwise pick the n-th set bit
+        for _ in range(random.randrange(bin(mask).count("1"))):
+            mask &= mask - 1  # drop the lowest set bit
+        return self.champions[(mask & -mask).bit_length() - 1]
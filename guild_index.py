@@ -0,0 +1,105 @@
+from bisect import bisect_left, insort
+from arena_cache import ArenaGamesCache
+
+
+class Leaderboard:
+    """Users sorted on their number of unique wins, highest first.
+
+    Entries are kept as (-wins, user_key) in a sorted list, so the rank of a user is a binary
+    search and the top N a slice. Users with the same number of wins are ordered on user_key.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._wins = {}  # user_key -> wins
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_key):
+        return user_key in self._wins
+
+    def set(self, user_key, wins):
+        previous = self._wins.get(user_key)
+        if previous == wins:
+            return
+        if previous is not None:
+            del self._entries[bisect_left(self._entries, (-previous, user_key))]
+        self._wins[user_key] = wins
+        insort(self._entries, (-wins, user_key))
+
+    def remove(self, user_key):
+        wins = self._wins.pop(user_key, None)
+        if wins is not None:
+            del self._entries[bisect_left(self._entries, (-wins, user_key))]
+
+    def top(self, count):
+        """[(user_key, wins)] of the best count users."""
+        return [(user_key, -wins) for wins, user_key in self._entries[:count]]
+
+    def rank(self, user_key):
+        """1 for the best user, None for users not on the leaderboard."""
+        wins = self._wins.get(user_key)
+        if wins is None:
+            return None
+        return bisect_left(self._entries, (-wins, user_key)) + 1
+
+    def wins(self, user_key):
+        return self._wins.get(user_key)
+
+
+class GuildIndex:
+    """The members of every guild by Discord ID, with a leaderboard of the registered ones per guild.
+
+    Kept up to date by the member join/remove events, and by ArenaGamesCache whenever the
+    unique wins of a user change.
+    """
+
+    def __init__(self, games_cache: ArenaGamesCache):
+        self.games_cache = games_cache
+        self.members = {}  # guild_id -> {user_key}
+        self.guilds_of = {}  # user_key -> {guild_id}
+        self.leaderboards = {}  # guild_id -> Leaderboard
+        games_cache.add_listener(self.wins_changed)
+
+    def add_guild(self, guild_id, member_ids):
+        self.remove_guild(guild_id)
+        self.members[guild_id] = set()
+        self.leaderboards[guild_id] = Leaderboard()
+        for member_id in member_ids:
+            self.add_member(guild_id, member_id)
+
+    def remove_guild(self, guild_id):
+        for user_key in self.members.pop(guild_id, ()):
+            self.guilds_of[user_key].discard(guild_id)
+            if not self.guilds_of[user_key]:
+                del self.guilds_of[user_key]
+        self.leaderboards.pop(guild_id, None)
+
+    def add_member(self, guild_id, member_id):
+        if guild_id not in self.members:
+            return
+        user_key = str(member_id)
+        self.members[guild_id].add(user_key)
+        self.guilds_of.setdefault(user_key, set()).add(guild_id)
+        user_data = self.games_cache.get_user(user_key)
+        if user_data is not None:
+            self.leaderboards[guild_id].set(user_key, len(user_data.unique_win_champions()))
+
+    def remove_member(self, guild_id, member_id):
+        user_key = str(member_id)
+        if user_key not in self.members.get(guild_id, ()):
+            return
+        self.members[guild_id].discard(user_key)
+        self.guilds_of[user_key].discard(guild_id)
+        if not self.guilds_of[user_key]:
+            del self.guilds_of[user_key]
+        self.leaderboards[guild_id].remove(user_key)
+
+    def wins_changed(self, user_key, wins):
+        for guild_id in self.guilds_of.get(user_key, ()):
+            self.leaderboards[guild_id].set(user_key, wins)
+
+    def leaderboard(self, guild_id):
+        """The leaderboard of the guild, empty for guilds the bot has not seen yet."""
+        return self.leaderboards.get(guild_id) or Leaderboard()
@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from io import BytesIO
+
+BACKGROUND_PATH = "assets/leaderboard_bg1.png"
+FONT_PATH = "assets/Heavitas.ttf"
+AVATAR_CACHE_SIZE = 256  # decoded and resized avatars
+IMAGE_CACHE_SIZE = 32  # rendered leaderboard PNGs
+
+# Avatar position and size, and where the score goes, for the top 3
+PLACES = [
+    {"coords": (414, 250, 152, 152), "text_offset": (420, 420), "font_size": 28},  # First place
+    {"coords": (245, 250, 105, 105), "text_offset": (255, 365), "font_size": 20},  # Second place
+    {"coords": (630, 250, 105, 105), "text_offset": (640, 365), "font_size": 20}   # Third place
+]
+
+
+class LRUCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+class LeaderboardImageRenderer:
+    """Renders the top 3 leaderboard image without blocking the event loop.
+
+    Avatars are downloaded with the Discord client, decoding and drawing run in the default executor.
+    The background and fonts are loaded once, avatars are cached by their hash and finished images
+    by a hash of what is on them, so asking for an unchanged leaderboard again costs nothing.
+    """
+
+    def __init__(self):
+        self.avatars = LRUCache(AVATAR_CACHE_SIZE)  # (avatar hash, size) -> RGBA image
+        self.images = LRUCache(IMAGE_CACHE_SIZE)  # content hash -> PNG bytes
+        self._background = None
+        self._fonts = None
+
+    def _load_assets(self):
+        # PIL is imported on first use, it is not needed to start the bot
+        from PIL import Image, ImageFont
+        if self._background is None:
+            self._background = Image.open(BACKGROUND_PATH).convert('RGBA')
+            self._fonts = {size: ImageFont.truetype(FONT_PATH, size) for size in {place["font_size"] for place in PLACES}}
+
+    @staticmethod
+    def _decode_avatar(data, size):
+        from PIL import Image
+        return Image.open(BytesIO(data)).convert('RGBA').resize((size, size))
+
+    async def _avatar(self, asset, size):
+        """asset is a discord.Asset, e.g. member.display_avatar."""
+        key = (asset.key, size)
+        avatar = self.avatars.get(key)
+        if avatar is None:
+            data = await asset.replace(size=256).read()
+            avatar = await asyncio.get_running_loop().run_in_executor(None, self._decode_avatar, data, size)
+            self.avatars.put(key, avatar)
+        return avatar
+
+    def _draw(self, scores, avatars):
+        from PIL import ImageDraw
+        self._load_assets()
+        background = self._background.copy()
+        draw = ImageDraw.Draw(background)
+        for place, score, avatar in zip(PLACES, scores, avatars):
+            background.paste(avatar, place["coords"][:2], avatar.split()[3])
+            draw.text(place["text_offset"], f"{score} Wins", font=self._fonts[place["font_size"]], fill='#553EF9')
+        buffer = BytesIO()
+        background.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    async def render(self, entries):
+        """entries: [(score, avatar asset)] for the top 3, best first. Returns the image as PNG bytes."""
+        entries = entries[:len(PLACES)]
+        content_hash = hashlib.sha1(repr([(score, asset.key) for score, asset in entries]).encode()).hexdigest()
+        image = self.images.get(content_hash)
+        if image is None:
+            avatars = await asyncio.gather(*(
+                self._avatar(asset, place["coords"][2]) for place, (_, asset) in zip(PLACES, entries)
+            ))
+            scores = [score for score, _ in entries]
+            image = await asyncio.get_running_loop().run_in_executor(None, self._draw, scores, avatars)
+            self.images.put(content_hash, image)
+        return image
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import metrics
+
+CHECK_INTERVAL = 0.1  # seconds between two heartbeats of the event loop
+LAG_THRESHOLD = 0.25  # seconds the loop may be blocked before the stack is captured
+STACK_DEPTH = 20  # frames kept of the example stack of a call site
+WATCHDOG_FILE = os.path.abspath(__file__)
+PROJECT_DIR = os.path.dirname(WATCHDOG_FILE)
+
+
+def call_site(frame):
+    """The innermost frame of the bot's own code, e.g. "main.py:120 in generate_champions".
+
+    Blocking calls usually end deep in a library, the line of the bot that called it is the one to fix.
+    """
+    innermost = frame
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_DIR) and filename != WATCHDOG_FILE and "site-packages" not in filename:
+            break
+        frame = frame.f_back
+    frame = frame or innermost
+    return f"{os.path.relpath(frame.f_code.co_filename, PROJECT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+class BlockingSite:
+    def __init__(self, stack):
+        self.stalls = 0
+        self.seconds = 0.0  # time the loop was seen blocked in this site, in steps of the check interval
+        self.max_lag = 0.0
+        self.stack = stack
+
+
+class LoopWatchdog:
+    """Measures the lag of the event loop and finds the code blocking it.
+
+    A heartbeat task on the loop records how late its sleeps wake up. A thread watches the heartbeat, when it
+    stops for longer than the threshold the thread captures the stack of the loop thread, aggregated by call site.
+    """
+
+    def __init__(self, threshold=LAG_THRESHOLD, interval=CHECK_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.sites = {}  # call site -> BlockingSite
+        self._last_beat = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._last_beat = time.monotonic()
+            metrics.event_loop_lag_seconds.observe(lag)
+
+    def _watch(self):
+        stalled_beat = None  # last heartbeat before the current stall
+        stall_sites = set()  # sites already counted for the current stall
+        while not self._stop.wait(self.interval / 2):
+            last_beat = self._last_beat
+            if last_beat is None:
+                continue
+            lag = time.monotonic() - last_beat - self.interval
+            if lag < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            site = call_site(frame)
+            if last_beat != stalled_beat:
+                stalled_beat = last_beat
+                stall_sites = set()
+            with self._lock:
+                blocking_site = self.sites.get(site)
+                if blocking_site is None:
+                    stack = "".join(traceback.format_stack(frame, limit=STACK_DEPTH))
+                    blocking_site = self.sites[site] = BlockingSite(stack)
+                if site not in stall_sites:
+                    stall_sites.add(site)
+                    blocking_site.stalls += 1
+                    metrics.event_loop_stalls_total.inc(site=site)
+                blocking_site.seconds += self.interval / 2
+                blocking_site.max_lag = max(blocking_site.max_lag, lag)
+            del frame
+
+    def report(self, limit=10, stacks=True):
+        """The call sites that blocked the loop the longest, with an example stack of each."""
+        with self._lock:
+            sites = sorted(self.sites.items(), key=lambda item: item[1].seconds, reverse=True)[:limit]
+            if not sites:
+                return "The event loop has not been blocked."
+            lines = []
+            for site, blocking_site in sites:
+                lines.append(
+                    f"{site}: {blocking_site.stalls} stalls, ~{blocking_site.seconds:.1f} s blocked, "
+                    f"longest {blocking_site.max_lag:.2f} s"
+                )
+                if stacks:
+                    lines.append(blocking_site.stack)
+            return "\n".join(lines)
+
+    def start(self):
+        if self._task is None:
+            self._loop_thread_id = threading.get_ident()
+            self._last_beat = time.monotonic()
+            self._task = asyncio.create_task(self._heartbeat())
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    async def close(self):
+        if self._task is not None:
+            self._stop.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._thread.join()
+            self._thread = None
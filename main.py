@@ -1,48 +1,123 @@
-import os, json, random, discord, subprocess, requests
 import time
+startup_start = time.perf_counter()  # before the other imports, so the startup timings include them
+import random, discord, subprocess
+import asyncio
+from contextlib import contextmanager
 from typing import List
 from dotenv import dotenv_values
 from discord import app_commands
 from discord.ext import commands
 from discord.ui import Button, View, Modal, TextInput
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 from summoner_wins import CustomRiotAPI
+from arena_storage import ArenaStorage, DB_FILENAME, LEGACY_GAMES_FILENAME
+from arena_cache import ArenaGamesCache
+from arena_journal import ArenaJournal, JOURNAL_FILENAME
+from arena_migrations import run_migrations
+from match_cache import MatchCache
+from sync_scheduler import SyncScheduler
+from champion_index import ChampionIndex, url_name
+from guild_index import GuildIndex
+from leaderboard_image import LeaderboardImageRenderer
+from metrics import timed, registry as metrics_registry, MetricsServer
+from loop_watchdog import LoopWatchdog
+from profiling import profiler
+
+print(f"Startup: imports took {(time.perf_counter() - startup_start) * 1000:.0f} ms")
+
+@contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    yield
+    print(f"Startup: {name} took {(time.perf_counter() - start) * 1000:.0f} ms")
 
-def load_champion_list(file_path="lol_champions.json"):
-    with open(file_path, "r") as file:
-        data = json.load(file)
-    return data["champions"]
+# List of League of Legends champions
+with startup_phase("champion index"):
+    champion_index = ChampionIndex.from_file("lol_champions.json")
 
-# Helper function to load or initialize the wins data
-def load_arena_games():
-    if os.path.exists(GAMES_FILENAME):
-        try:
-            with open(GAMES_FILENAME, "r") as file:
-                return json.load(file)
-        except json.JSONDecodeError:
-            return {}
-    return {}
+# Arena games storage, the games themselves are loaded by setup_hook
+storage = ArenaStorage(DB_FILENAME)
+games_cache = ArenaGamesCache(storage, champion_index, journal=ArenaJournal(JOURNAL_FILENAME))
+# Registered members and leaderboard per guild, filled by the guild and member events below
+guild_index = GuildIndex(games_cache)
 
-# List of League of Legends champions
-LOL_CHAMPIONS = load_champion_list()
-GAMES_FILENAME = "arena_games.json"
+# Raw match payloads, so re-syncs don't download the same matches again. Indexed in setup_hook
+match_cache = MatchCache()
 
 # Get tokens
 env = dotenv_values('.env')
 BOT_TOKEN = env.get('BOT_TOKEN_DEV') or env.get('BOT_TOKEN')
 GUILD_ID = env.get("GUILD_ID", None)
 RIOT_API_TOKEN = env.get("RIOT_API_TOKEN", None)
+RIOT_API_BASE_URL = env.get("RIOT_API_BASE_URL", None)  # only to point the bot to a fake Riot API
+METRICS_PORT = int(env.get("METRICS_PORT", 9108))  # Prometheus metrics on localhost, 0 turns them off
+LOOP_LAG_THRESHOLD = float(env.get("LOOP_LAG_THRESHOLD", 0.25))  # seconds, 0 turns the watchdog off
 
 # Bot Variables
 intents = discord.Intents.all()
 intents.voice_states = True
 intents.message_content = True
-client = discord.Client(intents=intents)
+
+class ArenaClient(discord.Client):
+    ready_logged = False
+
+    async def setup_hook(self):
+        if LOOP_LAG_THRESHOLD:
+            # Started first, so blocking calls during the startup are caught too
+            loop_watchdog.start()
+        # Runs next to the login, a slow network doesn't hold up the startup
+        self.git_status_task = asyncio.create_task(github_status())
+
+        with startup_phase("match cache index"):
+            await asyncio.get_running_loop().run_in_executor(None, match_cache.load)
+        with startup_phase("legacy games import"):
+            # Imports the old arena_games.json the first time
+            storage.migrate_from_json(LEGACY_GAMES_FILENAME)
+        with startup_phase("migrations"):
+            # Upgrade the stored games to the current version, instead of wiping them on every deploy
+            await run_migrations(storage, riot_api, champion_index, match_cache)
+        with startup_phase("journal replay"):
+            # Changes that were not written to the storage yet when the bot stopped
+            replayed = games_cache.replay_journal()
+            if replayed:
+                print(f"Replayed {replayed} changes from the journal")
+        with startup_phase("arena games"):
+            # Before the login, the guild events need all users and must not load them on the event loop.
+            # Nothing else uses the cache until then
+            await asyncio.get_running_loop().run_in_executor(None, games_cache.load_all)
+        games_cache.start()
+        await riot_api.start()
+        # Keeps the games of all linked summoners up to date in the background
+        sync_scheduler.start()
+        if METRICS_PORT:
+            try:
+                await metrics_server.start()
+            except OSError as e:
+                print(f"Metrics: could not listen on port {METRICS_PORT}: {e}")
+
+    async def on_ready(self):
+        if not self.ready_logged:
+            self.ready_logged = True
+            print(f"Startup: ready after {time.perf_counter() - startup_start:.2f} s")
+
+    async def close(self):
+        # Write the pending changes before shutting down
+        await sync_scheduler.close()
+        await metrics_server.close()
+        await loop_watchdog.close()
+        await riot_api.close()
+        await games_cache.close()
+        await super().close()
+
+client = ArenaClient(intents=intents)
 tree = app_commands.CommandTree(client)
-riot_api = CustomRiotAPI(RIOT_API_TOKEN)
+riot_api = CustomRiotAPI(RIOT_API_TOKEN, games_cache, match_cache, base_url=RIOT_API_BASE_URL)
+sync_scheduler = SyncScheduler(riot_api, games_cache, champion_index)
 last_reroll_time = time.time()
+leaderboard_renderer = LeaderboardImageRenderer()
+metrics_server = MetricsServer(METRICS_PORT)
+loop_watchdog = LoopWatchdog(LOOP_LAG_THRESHOLD)
 
 class TeamMemberSelectionView(discord.ui.View):
     def __init__(self, members):
@@ -63,6 +138,7 @@ class TeamMemberSelectMenu(discord.ui.Select):
             options=options
         )
 
+    @timed("callback")
     async def callback(self, interaction: discord.Interaction):
         selected_members = [discord.utils.get(interaction.guild.members, id=int(member_id)) for member_id in self.values]
         selected_members = [member for member in selected_members if member is not None]  # Filter out None values
@@ -88,30 +164,19 @@ class AddChampionModal(Modal):
         self.champion_input = TextInput(label="Champion Name", placeholder="e.g., Ahri, Zed")
         self.add_item(self.champion_input)
 
+    @timed("callback")
     async def on_submit(self, interaction: discord.Interaction):
         entered_champion = self.champion_input.value.strip()
-        entered_champion = next((champion for champion in LOL_CHAMPIONS if champion.lower() == entered_champion.lower()), entered_champion)
+        entered_champion = champion_index.resolve(entered_champion, entered_champion)
 
-        if entered_champion not in LOL_CHAMPIONS:
+        if entered_champion not in champion_index.champions:
             await interaction.response.send_message(f"Champion **{entered_champion}** not found in the available champion list.", ephemeral=True)
             return
 
-        arena_games = load_arena_games()
         user_key = str(self.user_id)
+        win_timestamp = datetime.now().strftime("%d-%m-%Y %H:%M")
 
-        if user_key not in arena_games:
-            arena_games[user_key] = {"name": interaction.user.name, "wins": []}
-        elif "wins" not in arena_games[user_key]:
-            arena_games[user_key]["wins"] = []
-
-        existing_champions = [win["champion"] for win in arena_games[user_key]["wins"]]
-        if entered_champion not in existing_champions:
-            arena_games[user_key]["wins"].append({
-                "champion": entered_champion,
-                "timestamp": datetime.now().strftime("%d-%m-%Y %H:%M")
-            })
-            save_arena_games(arena_games)
-            
+        if games_cache.add_manual_win(user_key, interaction.user.name, entered_champion, win_timestamp):
             # Fetch the new embed and view with the updated win list
             embed, view = await get_wins_embed_and_view(interaction, interaction.user)
             status_message = f"✅**{entered_champion}** has been successfully added to your win list."
@@ -134,6 +199,7 @@ class ShowWinsView(View):
         show_wins_button.callback = self.show_wins_callback
         self.add_item(show_wins_button)
 
+    @timed("callback")
     async def show_wins_callback(self, interaction: discord.Interaction):
         # Call list_wins with the original context and send the output
         embed, view = await get_wins_embed_and_view(interaction)
@@ -177,6 +243,7 @@ class ChampionButtonView(View):
         game_win_button.callback = self.game_win
         # self.add_item(game_win_button)
 
+    @timed("callback")
     async def generate_again(self, interaction: discord.Interaction):
         global last_reroll_time
         reroll_timeout = 1 # 2 seconds
@@ -191,10 +258,12 @@ class ChampionButtonView(View):
             print("too quick")
 
         
+    @timed("callback")
     async def next_game(self, interaction: discord.Interaction):
         await interaction.response.defer()
         await generate_champions(interaction, 0, 2, self.teammate_name, True)
 
+    @timed("callback")
     async def game_win(self, interaction: discord.Interaction):
         clicked_user = interaction.user
         if clicked_user.name != self.teammate_name:
@@ -203,20 +272,8 @@ class ChampionButtonView(View):
             winner_champion = self.champions[1]
 
         win_timestamp = datetime.now().strftime("%d-%m-%Y %H:%M")
-        arena_games = load_arena_games()
         user_key = str(clicked_user.id)
-        if user_key not in arena_games:
-            arena_games[user_key] = {"name": clicked_user.name, "wins": []}
-        elif "wins" not in arena_games[user_key]:
-            arena_games[user_key]["wins"] = []
-
-        existing_champions = [win["champion"] for win in arena_games[user_key]["wins"]]
-        if winner_champion not in existing_champions:
-            arena_games[user_key]["wins"].append({
-                "champion": winner_champion,
-                "timestamp": win_timestamp
-            })
-            save_arena_games(arena_games)
+        if games_cache.add_manual_win(user_key, clicked_user.name, winner_champion, win_timestamp):
             status_message = f"**{winner_champion}** successfully added to your win-list."
         else:
             status_message = f"**{winner_champion}** is already in your win-list."
@@ -241,24 +298,16 @@ class RemoveChampionModal(Modal):
         self.add_item(self.champion_input)
 
 
+    @timed("callback")
     async def on_submit(self, interaction: discord.Interaction):
         entered_champion = self.champion_input.value.strip()  # Capitalize for consistent formatting
-        entered_champion_filtered = next((champion for champion in LOL_CHAMPIONS if champion.lower() == entered_champion.lower()), None)
-
-        # Load existing wins data
-        arena_games = load_arena_games()
+        entered_champion_filtered = champion_index.resolve(entered_champion)
 
         # Remove the entered champion from the user's list
         user_key = str(self.user_id)
-        if entered_champion_filtered and user_key in arena_games and "wins" in arena_games[user_key]:
-            original_count = len(arena_games[user_key]["wins"])
-            arena_games[user_key]["wins"] = [
-                win for win in arena_games[user_key]["wins"] if win["champion"].lower() != entered_champion_filtered.lower()
-            ]
-            save_arena_games(arena_games)
-
+        if entered_champion_filtered:
             # Check if a champion was actually removed
-            if len(arena_games[user_key]["wins"]) < original_count:
+            if games_cache.remove_manual_win(user_key, entered_champion_filtered):
                 status_message = f"❌**{entered_champion_filtered}** has been removed from your win-list."
             else:
                 status_message = f"**{entered_champion_filtered}** is not in your win-list."
@@ -279,6 +328,7 @@ class AddChampionView(View):
         self.add_button.callback = self.add_champion_callback
         self.add_item(self.add_button)
 
+    @timed("callback")
     async def add_champion_callback(self, interaction: discord.Interaction):
         # Ensure only the intended user can interact
         if str(interaction.user.id) != str(self.user_id):
@@ -298,6 +348,7 @@ class RemoveChampionView(View):
         self.remove_button.callback = self.remove_champion_callback
         self.add_item(self.remove_button)
 
+    @timed("callback")
     async def remove_champion_callback(self, interaction: discord.Interaction):
         # Ensure only the intended user can interact
         if str(interaction.user.id) != str(self.user_id):
@@ -315,6 +366,7 @@ class UpdateChampionModal(Modal):
         self.summoner_input = TextInput(label="Summoner Name#Tagline", placeholder="e.g., thebausffs#euw")
         self.add_item(self.summoner_input)
 
+    @timed("callback")
     async def on_submit(self, interaction: discord.Interaction):
         input_text = self.summoner_input.value.strip()
         summoner_name, _, tagline = input_text.partition('#')
@@ -334,15 +386,16 @@ class UpdateChampionView(View):
         self.update_button.callback = self.update_champion_callback
         self.add_item(self.update_button)
 
+    @timed("callback")
     async def update_champion_callback(self, interaction: discord.Interaction):
         if str(interaction.user.id) != str(self.user_id):
             await interaction.response.send_message("You can only modify your own win list. Use `/wins` to see your own win list.", ephemeral=True)
             return
 
-        arena_games = load_arena_games()
         user_key = str(self.user_id)
-        summoner_name = arena_games.get(user_key, {}).get("summoner_name", None)
-        tagline = arena_games.get(user_key, {}).get("summoner_tagline", None)
+        user_data = games_cache.get_user(user_key) or {}
+        summoner_name = user_data.get("summoner_name", None)
+        tagline = user_data.get("summoner_tagline", None)
 
         if summoner_name and tagline:
             embed, view = await get_wins_embed_and_view(interaction, interaction.user)
@@ -350,12 +403,12 @@ class UpdateChampionView(View):
             await interaction.response.edit_message(content=status_message, embed=embed, view=view)
             puuid = await riot_api.get_puuid(summoner_name, tagline)
             if puuid:
-                latest_update = arena_games.get(user_key, {}).get("latest_update", None)
+                latest_update = user_data.get("latest_update", None)
                 user_name = interaction.user.name
-                await riot_api.update_arena_games(interaction, user_key, user_name, puuid, LOL_CHAMPIONS, latest_update)
+                complete = await riot_api.update_arena_games(interaction, user_key, user_name, puuid, champion_index, latest_update)
                 
                 # send new list to user message
-                status_message = "Win list updated ✅"
+                status_message = "Win list updated ✅" if complete else SYNC_INCOMPLETE_MESSAGE
                 embed, view = await get_wins_embed_and_view(interaction, interaction.user)
                 await interaction.edit_original_response(content=status_message, embed=embed, view=view)
         else:
@@ -371,6 +424,7 @@ class SeeAllLeaderboardView(View):
         self.interaction = interaction  # Store the context to use in callback
         self.add_item(self.show_more_button)
 
+    @timed("callback")
     async def show_more_callback(self, interaction: discord.Interaction):
         # Call list_leaderboard when the button is clicked
         embed, view = await create_leaderboard(interaction)
@@ -395,6 +449,7 @@ class SearchChampionModal(Modal):
         self.champion_input = TextInput(label="Enter Champion Name", placeholder="e.g., Ahri, Zed")
         self.add_item(self.champion_input)
 
+    @timed("callback")
     async def on_submit(self, interaction: discord.Interaction):
         # Fetch the entered champion name and search in the champion list
         input_champion = self.champion_input.value.strip()
@@ -410,6 +465,7 @@ class SearchChampionView(View):
         self.search_button.callback = self.search_champion_callback
         self.add_item(self.search_button)
 
+    @timed("callback")
     async def search_champion_callback(self, interaction: discord.Interaction):
         if str(interaction.user.id) != str(self.user_id):
             await interaction.response.send_message("You can only search your own win list. Use `/wins` to see your own win list.", ephemeral=True)
@@ -423,6 +479,7 @@ class ChangeSummonerNameButton(Button):
         self.user_id = user_id
         self.ctx = ctx
 
+    @timed("callback")
     async def callback(self, interaction: discord.Interaction):
         if str(interaction.user.id) != str(self.user_id):
             await interaction.response.send_message("You can only edit your own win list. Use `/wins` to see your own win list.", ephemeral=True)
@@ -439,18 +496,21 @@ class ChangeSummonerNameModal(Modal):
         self.summoner_name_input = TextInput(label="New Summoner Name#Tagline", placeholder="e.g., Thebausffs#euw")
 
         self.add_item(self.summoner_name_input)
+    @timed("callback")
     async def on_submit(self, interaction: discord.Interaction):
         input_text = self.summoner_name_input.value.strip()
         summoner_name, _, tagline = input_text.partition('#')
-        arena_games = load_arena_games()
         user_key = str(self.user_id)
 
-        if user_key in arena_games:
+        if games_cache.get_user(user_key):
             await update_arena_games(interaction, summoner_name, tagline, self.user_id)
         else:
             await interaction.response.send_message("No previous summoner data found. Please use the correct method to add a new summoner.", ephemeral=True)
 
 
+SYNC_INCOMPLETE_MESSAGE = "Riot Games did not respond to every request, part of the win list is updated. Try again later ⚠️"
+
+
 async def update_arena_games(interaction: discord.Interaction, summoner_name: str, tagline: str, user_id: int):
     puuid = await riot_api.get_puuid(summoner_name, tagline)
     if puuid:
@@ -460,19 +520,14 @@ async def update_arena_games(interaction: discord.Interaction, summoner_name: st
         await interaction.response.send_message(f"Updating champion wins for **{summoner_name}#{tagline}**. This process may take a few minutes as it's the first time. (approximately 5 minutes ⌛)")
         
         user_name = interaction.user.name
-        await riot_api.update_arena_games(interaction, user_key, user_name, puuid, LOL_CHAMPIONS, None, summoner_name, tagline)
+        complete = await riot_api.update_arena_games(interaction, user_key, user_name, puuid, champion_index, None, summoner_name, tagline)
         embed, view = await get_wins_embed_and_view(interaction)
-        status_message = "Win list synced with Riot Games ✅"
+        status_message = "Win list synced with Riot Games ✅" if complete else SYNC_INCOMPLETE_MESSAGE
         await interaction.edit_original_response(content=status_message, embed=embed, view=view)
     else:
         await interaction.response.send_message(f"Summoner with name **{summoner_name}** and tagline **{tagline}** doesn't exist", ephemeral=True)
         return
     
-# Helper function to save the wins data
-def save_arena_games(data):
-    with open(GAMES_FILENAME, "w") as file:
-        json.dump(data, file, indent=4)
-
 def epoch_to_str(epoch):
     try:
         epoch_time = epoch / 1000  # Convert milliseconds to seconds
@@ -481,16 +536,10 @@ def epoch_to_str(epoch):
     except:
         return epoch
 
-def get_wins_as_dict(all_arena_games: dict, user_key):
-    arena_games =  all_arena_games.get(user_key, {}).get('arena_games', [])
-    if not arena_games:
-        return False
-    player_games = [values for values in arena_games.values()]
-    
-    # Ensure player_games is a list and filter entries where 'place' is 1
-    first_place_games = [game for game in player_games if game.get('place') == 1]
-    # Sort the list of dictionaries based on 'timestamp'
-    return sorted(first_place_games, key=lambda x: x['timestamp'])
+def get_wins_as_dict(user_key):
+    # All games where 'place' is 1, sorted on 'timestamp'
+    user_data = games_cache.get_user(user_key)
+    return user_data.wins() if user_data else []
 
 def get_first_wins_as_dict(wins):
     if not wins:
@@ -499,14 +548,14 @@ def get_first_wins_as_dict(wins):
     champions = set()
     first_wins = []
     for win in wins:
-        if win['champion'] not in champions:
-            champions.add(win['champion'])
+        if win.champion not in champions:
+            champions.add(win.champion)
             first_wins.append(win)
     return first_wins
 
-def get_unique_user_wins(arena_games, user_id):
-    wins = get_wins_as_dict(arena_games, user_id)
-    return list({win['champion'] for win in wins}) if wins else []
+def get_unique_user_wins(user_id):
+    user_data = games_cache.get_user(user_id)
+    return user_data.unique_win_champions() if user_data else set()
 
 
 async def get_wins_embed_and_view(interaction, target_user=None):
@@ -514,9 +563,8 @@ async def get_wins_embed_and_view(interaction, target_user=None):
     user_key = str(target_user.id) if target_user else str(interaction.user.id)
     user_name = target_user.name if target_user else interaction.user.name
 
-    # Load the arena games from storage
-    arena_games = load_arena_games()
-    user_data = arena_games.get(user_key, {})
+    # Get the user from the cache
+    user_data = games_cache.get_user(user_key) or {}
 
     # Extract relevant user data
     summoner_name = user_data.get("summoner_name", user_name)
@@ -524,14 +572,14 @@ async def get_wins_embed_and_view(interaction, target_user=None):
     latest_update = user_data.get("latest_update", None)
 
     # Get the wins from the arena games (all wins where place == 1)
-    wins = get_wins_as_dict(arena_games, user_key)
+    wins = get_wins_as_dict(user_key)
     first_wins = get_first_wins_as_dict(wins)
     
     # Calculate total win counts per champion
     win_counts = {}
     if wins:
         for win in wins:
-            champ = win['champion']
+            champ = win.champion
             win_counts[champ] = win_counts.get(champ, 0) + 1
 
     last_updated = epoch_to_str(latest_update) if latest_update else "Not updated"
@@ -541,7 +589,7 @@ async def get_wins_embed_and_view(interaction, target_user=None):
 
     # Build description including the total wins for each champion
     game_details_description = "\n".join([
-        f"• **{game['champion']}** - First win with {game['teammate_name']} as {game['teammate_champion']} on {epoch_to_str(game['timestamp'])} (Total wins: {win_counts.get(game['champion'], 0)})"
+        f"• **{game.champion}** - First win with {game.teammate_name} as {game.teammate_champion} on {epoch_to_str(game.timestamp)} (Total wins: {win_counts.get(game.champion, 0)})"
         for game in first_wins
     ]) if first_wins else "No recorded wins." + extra_notice
 
@@ -574,11 +622,14 @@ async def get_wins_embed_and_view(interaction, target_user=None):
     description="Shows your wins",
 )
 @app_commands.describe(member="Show wins of specific user")
+@timed("command", "wins")
 async def list_wins(interaction: discord.Interaction, member: discord.Member = None):
     embed, view = await get_wins_embed_and_view(interaction, member)
     await interaction.response.send_message(embed=embed, view=view)
 
 
+LEADERBOARD_SIZE = 25  # users shown by /leaderboard
+
 def split_leaderboard(leaderboard, length=3):
     limited_items = {}
     for key, value in leaderboard.items():
@@ -591,44 +642,61 @@ def split_leaderboard(leaderboard, length=3):
     name="leaderboard_image",
     description="Shows leaderboard image (WORK IN PROGRESS)",
 )
+@timed("command", "leaderboard_image")
 async def send_leaderboard_image(interaction: discord.Interaction):
     # Acknowledge the interaction and inform the user that the image is being generated.
     await interaction.response.defer()  # Use ephemeral if you want it to be visible only to the user
     await interaction.followup.send("Generating the leaderboard image, please wait...")
 
     # Generate the leaderboard image
-    wins_data = load_arena_games()
-    leaderboard = {id: len(info['wins']) for id, info in wins_data.items() if discord.utils.get(interaction.guild.members, name=info['name'])}
-
-    # Sort and split the leaderboard
-    leaderboard = dict(sorted(leaderboard.items(), key=lambda item: item[1], reverse=True))
-    avatar_info = [fetch_discord_avatar_and_username(user_id, BOT_TOKEN) for user_id in leaderboard.keys()]
-    file_path = await generate_leaderboard_with_avatars(leaderboard, avatar_info)
+    leaderboard = guild_index.leaderboard(interaction.guild.id).top(3)
+    users = [await get_discord_user(interaction.guild, user_key) for user_key, _ in leaderboard]
+    image = await leaderboard_renderer.render([(score, user.display_avatar) for (_, score), user in zip(leaderboard, users)])
 
     # Replace the loading message with the actual image
-    file = discord.File(file_path, filename="leaderboard.png")
+    file = discord.File(BytesIO(image), filename="leaderboard.png")
     view = SeeAllLeaderboardView(interaction=interaction)  # Initialize the view with the current context
     await interaction.edit_original_response(content="", attachments=[file], view=view)
 
 
-async def create_leaderboard(interaction: discord.Interaction): 
-    all_arena_games = load_arena_games()
-    leaderboard = {}
-
-    for user_id, info in all_arena_games.items():
-        user = discord.utils.get(interaction.guild.members, name=info['name'])
-        if user:
-            wins = get_unique_user_wins(all_arena_games, user_id)
-            leaderboard[info['name']] = len(wins)
-
-    leaderboard_sorted = dict(sorted(leaderboard.items(), key=lambda item: item[1], reverse=True))
-    description = "\n".join([f"#{i+1} **{name}**:{total} win{'s' if total != 1 else ''}" \
-                             for i, (name, total) in enumerate(leaderboard_sorted.items())])
+# Stats summed over all games of a member, the best member of the server is shown under the leaderboard
+SERVER_TOTALS = (("Damage", "total_damage"), ("Kills", "total_kills"), ("Gold", "gold_earned"), ("Healing", "total_heal"))
+
+def server_totals(user_keys):
+    # One batched sum per member over the columnar games, the aggregates don't keep these totals
+    columns = games_cache.columns()
+    lines = []
+    for title, stat in SERVER_TOTALS:
+        totals = columns.user_sums(stat, user_keys)
+        user_key = max(totals, key=totals.get, default=None)
+        if user_key is not None and totals[user_key] > 0:
+            lines.append(f"**{title}**: {games_cache.get_user(user_key).get('name', user_key)} ({totals[user_key]:,})")
+    return "\n".join(lines)
+
+async def create_leaderboard(interaction: discord.Interaction, count=LEADERBOARD_SIZE):
+    leaderboard = guild_index.leaderboard(interaction.guild.id)
+
+    lines = []
+    for i, (user_key, total) in enumerate(leaderboard.top(count)):
+        name = games_cache.get_user(user_key).get('name', user_key)
+        lines.append(f"#{i+1} **{name}**:{total} win{'s' if total != 1 else ''}")
+
+    # Show where the caller stands when they are not in the top
+    user_key = str(interaction.user.id)
+    rank = leaderboard.rank(user_key)
+    if rank and rank > count:
+        total = leaderboard.wins(user_key)
+        lines.append(f"...\n#{rank} **{interaction.user.name}**:{total} win{'s' if total != 1 else ''}")
+
+    description = "\n".join(lines)
     embed = discord.Embed(
         title="Leaderboard 🏆",
         description=description,
         color=discord.Color.orange()
     ) 
+    totals = server_totals([user_key for user_key, _ in leaderboard.top(len(leaderboard))])
+    if totals:
+        embed.add_field(name="Server totals 📊", value=totals, inline=False)
 
     view = View()
     return embed, view
@@ -637,6 +705,7 @@ async def create_leaderboard(interaction: discord.Interaction):
     name="leaderboard",
     description="Show leaderboard of server",
 )
+@timed("command", "leaderboard")
 async def list_leaderboard(interaction: discord.Interaction):
     embed, view = await create_leaderboard(interaction)
     await interaction.response.send_message(embed=embed, view=view)
@@ -645,6 +714,7 @@ async def list_leaderboard(interaction: discord.Interaction):
     name="help",
     description="Show available commands",
 )
+@timed("command", "help")
 async def list_commands(interaction: discord.Interaction):
     embed = discord.Embed(
         title="Arena Commands",
@@ -656,6 +726,7 @@ async def list_commands(interaction: discord.Interaction):
         "`/teams [members]` \nGenerate random teams based on players in the current voice channel, or specified members.",
         "`/champions [member]` \nGenerate random champions for yourself or with specified teammate.",
         "`/wins [username]` \nShow the win list of the command issuer or a specified user.",
+        "`/common [member]` \nShow the champions everyone in the server, or you and a member, have won with and the ones nobody has won with yet.",
         "`/leaderboard` \nShow leaderboard of current server."
     ]
 
@@ -674,6 +745,7 @@ async def list_commands(interaction: discord.Interaction):
     description="Generate 2 random champions",
 )
 @app_commands.describe(teammate="Type the name of your teammate to generate a team of 2 champions")
+@timed("command", "champions")
 async def champions(interaction: discord.Interaction, teammate: discord.Member = None):
     if teammate:
         await generate_champions(interaction, 0, 2, teammate.name)
@@ -690,6 +762,7 @@ async def champions(interaction: discord.Interaction, teammate: discord.Member =
     app_commands.Choice(name="yes", value="yes"),
     app_commands.Choice(name="no", value="no")
 ])
+@timed("command", "teams")
 async def generate_teams(interaction: discord.Interaction, select_members: str = "no"):
     if select_members == "yes":
         voice_state = interaction.user.voice
@@ -739,128 +812,51 @@ async def generate_teams(interaction: discord.Interaction, select_members: str =
             await interaction.response.send_message("You need to be in a voice channel to use this command!", ephemeral=True)
 
 async def get_user_arena_stats(user_id: str):
-    """Retrieve a list of arena win statistics for a given user."""
-
-    # Load all arena game wins from storage
-    arena_games = load_arena_games()
-
-    # Check if the user has any recorded wins
-    if user_id not in arena_games:
-        return []
-
-    # Extract the list of win statistics for the specified user
-    user_wins = arena_games[user_id]['arena_games']
-    if not user_wins:
-        return []
-    stats = [user_wins[game_id] for game_id in user_wins]
+    """Retrieve the running stat totals of all arena games of a given user."""
 
-    return stats
+    user_data = games_cache.get_user(user_id)
+    return user_data.aggregate if user_data else None
 
 async def arena_stats_to_description(user_id):
     stats = await get_user_arena_stats(user_id)
-    if not stats:
+    if not stats or not stats.games_played:
         return None
-    
-    def get_most_played_champions():
-        # Accumulate the count of each champion played
-        champion_count = {}
-        for game in stats:
-            champion = game['champion']
-            if champion in champion_count:
-                champion_count[champion] += 1
-            else:
-                champion_count[champion] = 1
-
-        # Sort the champions based on the count, highest first
-        champion_count_sorted = sorted(champion_count.items(), key=lambda item: item[1], reverse=True)
-        
-        # Get the first five most played champions
-        first_five_dict = dict(champion_count_sorted[:5])
-        
-        # Return as a formatted string
-        return '\n'.join(f"• **{champ}**: {count} times" for champ, count in first_five_dict.items())
+    games_played = stats.games_played
 
-    def get_average_place():
-        if not stats:
-            return 0  # Avoid division by zero
-        return sum(game['place'] for game in stats) / len(stats)
-
-    def get_total_kda():
-        kills, deaths, assists = 0, 0, 0
-        for game in stats:
-            kills += game['stats'].get('total_kills', 0)
-            deaths += game['stats'].get('total_deaths', 0)
-            assists += game['stats'].get('total_assists', 0)
-        return f"{kills}/{deaths}/{assists}"
-
-    def get_total_healing():
-        return sum(game['stats'].get('total_heal', 0) for game in stats)
-
-    def get_total_shielding():
-        return sum(game['stats'].get('total_shielding_on_teammate', 0) for game in stats)
+    def get_most_played_champions():
+        # Get the first five most played champions as a formatted string
+        return '\n'.join(f"• **{champ}**: {count} times" for champ, count in stats.most_played_champions(5))
 
     def get_placement_stats():
-        if not stats:
-            return {"top_1_percent": 0, "top_4_percent": 0, "last_place_percent": 0}
-        placements = [game['place'] for game in stats]
-        total_games = len(placements)
-        top_1 = sum(1 for p in placements if p == 1)
-        top_4 = sum(1 for p in placements if p <= 4)
-        last_place = sum(1 for p in placements if p == 8)
         return {
-            "top_1": top_1,
-            "top_4": top_4,
-            "last_place": last_place
+            "top_1": stats.placement_count(lambda place: place == 1),
+            "top_4": stats.placement_count(lambda place: place <= 4),
+            "last_place": stats.placement_count(lambda place: place == 8)
         }
 
-    def get_most_stat(stat_key):
-        max_value = 0
-        max_champion = ""
-        for game in stats:
-            if 'stats' in game:
-                stat_value = game['stats'].get(stat_key, 0)
-                if stat_value > max_value:
-                    max_value = stat_value
-                    max_champion = game['champion']
-        if max_champion:  # Ensures that we found at least one valid game
-            return (max_value, max_champion)
-        else:
-            return (0, "No data")  # or any other default you'd prefer
-        
-    def get_most_ability_usage():
-        return max(
-            (sum(game['stats'].get(stat, 0) for stat in ['ability_1_used', 'ability_2_used', 'ability_3_used', 'ability_4_used']),
-            game['champion'],
-            max(('Q', game['stats'].get('ability_1_used', 0)),
-                ('W', game['stats'].get('ability_2_used', 0)),
-                ('E', game['stats'].get('ability_3_used', 0)),
-                ('R', game['stats'].get('ability_4_used', 0)), key=lambda x: x[1]))
-            for game in stats
-        )
-    
     # Building the description
     placement_stats = get_placement_stats()
-    most_damage = get_most_stat('total_damage')
-    total_usage, champion, (most_used_ability, count) = get_most_ability_usage()
-    most_cc_duration = get_most_stat('cc_duration')
-    most_gold = get_most_stat('gold_earned')
-    highest_crit = get_most_stat('highest_crit')
-    largest_killing_spree = get_most_stat('largestKillingSpree')
-    total_heal = get_total_healing()
-    total_shield = get_total_shielding()
-    most_heal = get_most_stat('total_heal') 
+    most_damage = stats.most_stat('total_damage')
+    total_usage, champion, (most_used_ability, count) = stats.most_ability_usage
+    most_cc_duration = stats.most_stat('cc_duration')
+    most_gold = stats.most_stat('gold_earned')
+    highest_crit = stats.most_stat('highest_crit')
+    largest_killing_spree = stats.most_stat('largestKillingSpree')
+    total_heal = stats.total_heal
+    total_shield = stats.total_shielding
+    most_heal = stats.most_stat('total_heal')
 
     description_items = [
-        f"**Total games played**: {len(stats)} \n {get_most_played_champions()}",
+        f"**Total games played**: {games_played} \n {get_most_played_champions()}",
         "",
-        f"**Total #1**: {placement_stats['top_1']} ({(100 * placement_stats['top_1'] / len(stats)):.1f}%)",
-        f"**Total top 4**: {placement_stats['top_4']} ({(100 * placement_stats['top_4'] / len(stats)):.1f}%)",
-        f"**Total last place**: {placement_stats['last_place']} ({(100 * placement_stats['last_place'] / len(stats)):.1f}%)",
-        f"**Average placement**: {get_average_place():.1f}",
+        f"**Total #1**: {placement_stats['top_1']} ({(100 * placement_stats['top_1'] / games_played):.1f}%)",
+        f"**Total top 4**: {placement_stats['top_4']} ({(100 * placement_stats['top_4'] / games_played):.1f}%)",
+        f"**Total last place**: {placement_stats['last_place']} ({(100 * placement_stats['last_place'] / games_played):.1f}%)",
+        f"**Average placement**: {stats.average_place():.1f}",
         "",
-        f"**Total K/D/A**: {get_total_kda()}",
-        f"**Total healing**: {total_heal} ({total_heal / len(stats):.1f} avg)",
-        f"**Total shielding**: {total_shield} ({total_shield / len(stats):.1f} avg)",
+        f"**Total K/D/A**: {stats.kills}/{stats.deaths}/{stats.assists}",
+        f"**Total healing**: {total_heal} ({total_heal / games_played:.1f} avg)",
+        f"**Total shielding**: {total_shield} ({total_shield / games_played:.1f} avg)",
         "",
         f"**Largest killing spree**: {largest_killing_spree[1]} ({largest_killing_spree[0]} kills)",
         f"**Most damage in one game**: {most_damage[1]} ({most_damage[0]} damage)",
@@ -873,8 +869,7 @@ async def arena_stats_to_description(user_id):
     return "\n".join(description_items)
 
 async def get_stats_embed(user_id: str):
-    arena_games = load_arena_games()
-    summoner_name = arena_games.get(user_id, {}).get("summoner_name", None)
+    summoner_name = (games_cache.get_user(user_id) or {}).get("summoner_name", None)
     description = await arena_stats_to_description(user_id)
     if not description:
         return None
@@ -891,6 +886,7 @@ async def get_stats_embed(user_id: str):
     description="Show intersting stats!",
 )
 @app_commands.describe(summoner_name="Name of the summoner")
+@timed("command", "stats")
 async def haswon(interaction: discord.Interaction, summoner_name: discord.Member = None):
     user_id = str(interaction.user.id)
     if summoner_name:
@@ -907,23 +903,20 @@ async def haswon(interaction: discord.Interaction, summoner_name: discord.Member
     await interaction.response.send_message(embed=embed)
 
 async def hasWon(interaction: discord.Interaction, entered_champion: str):
-    def normalize_name(name):
-        return name.lower().replace("'", "").replace(" ", "").replace(".", "")
-
-    all_arena_games = load_arena_games()
     user_id = str(interaction.user.id)
-    unique_user_wins = get_unique_user_wins(all_arena_games, user_id)
-    champion_name = next((champion for champion in LOL_CHAMPIONS if normalize_name(champion) == normalize_name(entered_champion)),None)
+    champion_name = champion_index.resolve(entered_champion)
 
     if not champion_name:
         return None, None
-    return champion_name in unique_user_wins, champion_name
+    return champion_name in get_unique_user_wins(user_id), champion_name
 
 async def has_won_on_champion(interaction: discord.Interaction, champion: str = None):
     if champion:
         haswon, champ_name_normalized = await hasWon(interaction, champion)
         if haswon == None:
-            await interaction.response.send_message(f"❓Champion **{champion}** does not exist.", ephemeral=True)
+            suggestion = champion_index.closest(champion)
+            hint = f" Did you mean **{suggestion}**?" if suggestion else ""
+            await interaction.response.send_message(f"❓Champion **{champion}** does not exist.{hint}", ephemeral=True)
         elif haswon == True:
             await interaction.response.send_message(f"🥇 You have won on **{champ_name_normalized}**.", ephemeral=True)
         elif haswon == False:
@@ -936,9 +929,47 @@ async def has_won_on_champion(interaction: discord.Interaction, champion: str =
     description="See if you have already won on a champion",
 )
 @app_commands.describe(champion="Name of the champion")
+@timed("command", "haswon")
 async def haswon(interaction: discord.Interaction, champion: str = None):
     await has_won_on_champion(interaction, champion)
     return
+
+@haswon.autocomplete("champion")
+async def haswon_champion_autocomplete(interaction: discord.Interaction, current: str):
+    return [app_commands.Choice(name=champion, value=champion) for champion in champion_index.suggest(current)]
+    
+MAX_FIELD_LENGTH = 1024  # characters in the value of an embed field
+
+def champion_list(mask):
+    champions = champion_index.champions_in(mask)
+    text = ", ".join(champions) or "None"
+    if len(text) > MAX_FIELD_LENGTH:
+        text = text[:MAX_FIELD_LENGTH - 20].rsplit(", ", 1)[0]
+        text += f" and {len(champions) - text.count(', ') - 1} more"
+    return text
+
+@tree.command(
+    name="common",
+    description="Champions won by all of you, and champions nobody has won yet",
+)
+@app_commands.describe(member="Compare with this member instead of everyone in the server")
+@timed("command", "common")
+async def common_wins(interaction: discord.Interaction, member: discord.Member = None):
+    if member:
+        user_keys = [str(interaction.user.id), str(member.id)]
+        title = f"{interaction.user.name} and {member.name}"
+    else:
+        leaderboard = guild_index.leaderboard(interaction.guild.id)
+        user_keys = [user_key for user_key, _ in leaderboard.top(len(leaderboard))]
+        title = f"Everyone in {interaction.guild.name}"
+
+    # Champion sets are bitmasks over champion_index, see ChampionIndex.bit
+    won_by_all = games_cache.won_by_all(user_keys) if user_keys else 0
+    won_by_nobody = champion_index.all_mask & ~games_cache.won_by_any(user_keys)
+    embed = discord.Embed(title=title, color=discord.Color.orange())
+    embed.add_field(name=f"🥇 Won by all ({bin(won_by_all).count('1')})", value=champion_list(won_by_all), inline=False)
+    embed.add_field(name=f"🎯 Won by nobody ({bin(won_by_nobody).count('1')})", value=champion_list(won_by_nobody), inline=False)
+    await interaction.response.send_message(embed=embed)
     
 async def generate_champions(interaction: discord.Interaction, reroll_count=0, max_rerolls=2, teammate_name=None, is_next_game=False):
     author = interaction.user.name 
@@ -949,14 +980,12 @@ async def generate_champions(interaction: discord.Interaction, reroll_count=0, m
         await interaction.response.send_message("You can not team up with yourself.", ephemeral=True)
         return
 
-    arena_games = load_arena_games()
-    user_wins = get_unique_user_wins(arena_games, user_id)
-    available_for_user = [champion for champion in LOL_CHAMPIONS if champion not in user_wins]
-    if not available_for_user:
+    # Champion sets are bitmasks over champion_index, see ChampionIndex.bit
+    available_for_user = champion_index.all_mask & ~games_cache.win_mask(user_id)
+    user_champion = champion_index.random_champion(available_for_user)
+    if user_champion is None:
         await interaction.response.send_message(f"{author}, you have won with all available champions.")
         return
-    
-    user_champion = random.choice(available_for_user)
 
     if teammate_name:
         target_user = discord.utils.get(interaction.guild.members, name=teammate_name)
@@ -964,23 +993,19 @@ async def generate_champions(interaction: discord.Interaction, reroll_count=0, m
             await interaction.response.send_message(f"User **{teammate_name}** not found.")
             return
         teammate_name_actual = teammate_name
-        teammate_wins = get_unique_user_wins(arena_games, str(target_user.id))
-        available_for_teammate = [champion for champion in LOL_CHAMPIONS if champion not in teammate_wins and champion != user_champion]
-        if not available_for_teammate:
+        teammate_wins = games_cache.win_mask(str(target_user.id))
+        available_for_teammate = champion_index.all_mask & ~teammate_wins & ~champion_index.bit(user_champion)
+        teammate_champion = champion_index.random_champion(available_for_teammate)
+        if teammate_champion is None:
             await interaction.response.send_message(f"{teammate_name_actual}, you have won with all available champions.")
             return
-        teammate_champion = random.choice(available_for_teammate)
     else:
         teammate_name_actual = "Teammate"
-        available_for_teammate = [champion for champion in LOL_CHAMPIONS if champion != user_champion]
-        teammate_champion = random.choice(available_for_teammate)
+        teammate_champion = champion_index.random_champion(champion_index.all_mask & ~champion_index.bit(user_champion))
 
-    def clean_name(name):
-        return name.lower().replace("'", "").replace(" ", "").replace(".", "")
-
-    user_champion_url = f"https://blitz.gg/lol/champions/{clean_name(user_champion)}/arena"
+    user_champion_url = f"https://blitz.gg/lol/champions/{url_name(user_champion)}/arena"
     user_hyperlink = f"[{user_champion}]({user_champion_url})"
-    teammate_champion_url = f"https://blitz.gg/lol/champions/{clean_name(teammate_champion)}/arena"
+    teammate_champion_url = f"https://blitz.gg/lol/champions/{url_name(teammate_champion)}/arena"
     teammate_hyperlink = f"[{teammate_champion}]({teammate_champion_url})"
 
     description = f"{author}: {user_hyperlink}\n{teammate_name_actual}: {teammate_hyperlink} \
@@ -1001,25 +1026,28 @@ async def generate_champions(interaction: discord.Interaction, reroll_count=0, m
     else:
         await interaction.response.edit_message(embed=embed, view=view)
 
-def github_status():
+GIT_TIMEOUT = 15  # seconds per git command, e.g. a fetch on a bad network
+
+async def run_git(*args):
+    process = await asyncio.create_subprocess_exec("git", *args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), GIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, ["git", *args], stdout, stderr)
+    return stdout.decode().strip()
+
+async def github_status():
     try:
         # Fetch the latest changes from the remote
-        subprocess.run(["git", "fetch"], check=True)
+        await run_git("fetch")
 
         # Check the difference between the local branch and the remote branch
-        local_branch = subprocess.run(
-            ["git", "rev-parse", "@"],
-            check=True,
-            stdout=subprocess.PIPE,
-            text=True
-        ).stdout.strip()
-        
-        remote_branch = subprocess.run(
-            ["git", "rev-parse", "@{u}"],
-            check=True,
-            stdout=subprocess.PIPE,
-            text=True
-        ).stdout.strip()
+        local_branch = await run_git("rev-parse", "@")
+        remote_branch = await run_git("rev-parse", "@{u}")
         
         # Check for differences between local and remote branches
         if local_branch == remote_branch:
@@ -1028,67 +1056,23 @@ def github_status():
             print("Your local branch is not up to date with the remote branch.")
             # Optionally, provide instructions for updating
             print("Consider pulling the latest changes with 'git pull'.")
+    except asyncio.TimeoutError:
+        print(f"Verifying Git Status: git did not respond within {GIT_TIMEOUT} seconds.")
     except subprocess.CalledProcessError as e:
         print("Verifying Git Status: Error while checking repository status:", e)
     except Exception as e:
         print("Verifying Git Status: An unexpected error occurred, probably because git is not installed.", e)
 
-def fetch_discord_avatar_and_username(user_id, BOT_TOKEN):
-    """Fetches the Discord avatar and username for a given user ID using the specified bot token."""
-    url = f"https://discord.com/api/v9/users/{user_id}"
-    headers = {"Authorization": f"Bot {BOT_TOKEN}"}
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        avatar_hash = data.get('avatar')
-        username = data.get('username', 'Unknown User')
-        if avatar_hash:
-            avatar_url = f"https://cdn.discordapp.com/avatars/{user_id}/{avatar_hash}.png?size=1024"
-            return avatar_url, username
-        return "path_to_default_avatar.png", username
-    else:
-        print(f"Failed to fetch data for user {user_id}: {response.status_code} - {response.text}")
-        return "path_to_default_avatar.png", 'Unknown User'
-
-
-async def generate_leaderboard_with_avatars(leaderboard_data, avatar_info):
-    """Generates and saves a leaderboard image with avatars, usernames, and scores."""
-    if not os.path.exists('leaderboards'):
-        os.makedirs('leaderboards')
-
-    background = Image.open('assets/leaderboard_bg1.png').convert('RGBA')
-    fonts = {
-        0: ImageFont.truetype("assets/Heavitas.ttf", 28),  # Larger font for 1st place
-        1: ImageFont.truetype("assets/Heavitas.ttf", 20),  # Standard font for others
-        2: ImageFont.truetype("assets/Heavitas.ttf", 20)
-    }
-
-    # Configuration for avatar and text placement
-    config = [
-        {"coords": (414, 250, 152, 152), "text_offset": (420, 420)},  # First place
-        {"coords": (245, 250, 105, 105), "text_offset": (255, 365)},  # Second place
-        {"coords": (630, 250, 105, 105), "text_offset": (640, 365)}   # Third place
-    ]
-
-    draw = ImageDraw.Draw(background)
-    sorted_leaderboard = sorted(leaderboard_data.items(), key=lambda item: item[1], reverse=True)[:3]
-    
-    for index, ((user_id, score), (avatar_url, username)) in enumerate(zip(sorted_leaderboard, avatar_info)):
-        avatar_image = Image.open(BytesIO(requests.get(avatar_url).content) if avatar_url.startswith('http') else avatar_url)
-        avatar_image = avatar_image.convert('RGBA').resize((config[index]["coords"][2], config[index]["coords"][3]))
-        mask = avatar_image.split()[3] if 'A' in avatar_image.getbands() else None
-        background.paste(avatar_image, config[index]["coords"][:2], mask)
-        draw.text(config[index]["text_offset"], f"{score} Wins", font=fonts[index], fill='#553EF9')
-
-    file_path = 'leaderboards/leaderboard_with_avatars.png'
-    background.save(file_path)
-    return file_path
+async def get_discord_user(guild: discord.Guild, user_key):
+    """The guild member, or the user when they are not in the member cache."""
+    return guild.get_member(int(user_key)) or await client.fetch_user(int(user_key))
 
 
 @tree.command(
     name="sync",
     description="Owner only",
 )
+@timed("command", "sync")
 async def sync(interaction: discord.Interaction):
     if str(interaction.user.id) == env.get("OWNER_ID"):
         if GUILD_ID:
@@ -1103,7 +1087,106 @@ async def sync(interaction: discord.Interaction):
     else:
         await interaction.response.send_message('You must be the owner to use this command!', ephemeral=True)
 
+@tree.command(
+    name="metrics",
+    description="Owner only",
+)
+@timed("command", "metrics")
+async def show_metrics(interaction: discord.Interaction):
+    if str(interaction.user.id) == env.get("OWNER_ID"):
+        summary = metrics_registry.summary()
+        if len(summary) > 1900:
+            # Too long for a message, send it as a file
+            file = discord.File(BytesIO(summary.encode()), filename="metrics.txt")
+            await interaction.response.send_message(file=file, ephemeral=True)
+        else:
+            await interaction.response.send_message(f"```\n{summary}\n```", ephemeral=True)
+    else:
+        await interaction.response.send_message('You must be the owner to use this command!', ephemeral=True)
+
+async def send_profile_report(interaction: discord.Interaction, report):
+    file = discord.File(BytesIO(report.encode()), filename="profile.txt")
+    try:
+        await interaction.followup.send("Profiling finished", file=file, ephemeral=True)
+    except discord.HTTPException as e:
+        # The interaction token expires after 15 minutes, the report is still available with /profile report
+        print(f"Error while sending the profile report: {e}")
+
+@tree.command(
+    name="profile",
+    description="Owner only",
+)
+@app_commands.describe(
+    action="Start or stop profiling, or show the status or the last report",
+    seconds="Profile for this many seconds",
+    invocations="Profile this many invocations",
+    handler="Only profile this command or callback, e.g. stats or AddChampionModal.on_submit"
+)
+@app_commands.choices(action=[
+    app_commands.Choice(name="start", value="start"),
+    app_commands.Choice(name="stop", value="stop"),
+    app_commands.Choice(name="status", value="status"),
+    app_commands.Choice(name="report", value="report")
+])
+# Not timed, it would end up in its own profile
+async def profile(interaction: discord.Interaction, action: str, seconds: int = None, invocations: int = None, handler: str = None):
+    if str(interaction.user.id) != env.get("OWNER_ID"):
+        await interaction.response.send_message('You must be the owner to use this command!', ephemeral=True)
+        return
+
+    if action == "start":
+        try:
+            profiler.start(seconds, invocations, handler, lambda report: send_profile_report(interaction, report))
+        except RuntimeError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+        await interaction.response.send_message(profiler.status(), ephemeral=True)
+    elif action == "status":
+        await interaction.response.send_message(profiler.status(), ephemeral=True)
+    else:
+        if action == "stop":
+            profiler.stop()
+        report = profiler.last_report
+        if report is None:
+            await interaction.response.send_message("No profile recorded yet.", ephemeral=True)
+            return
+        file = discord.File(BytesIO(report.encode()), filename="profile.txt")
+        await interaction.response.send_message(file=file, ephemeral=True)
+
+@tree.command(
+    name="blocking",
+    description="Owner only",
+)
+@timed("command", "blocking")
+async def show_blocking(interaction: discord.Interaction):
+    if str(interaction.user.id) == env.get("OWNER_ID"):
+        # Code that blocked the event loop, with a stack of every call site
+        file = discord.File(BytesIO(loop_watchdog.report().encode()), filename="blocking.txt")
+        await interaction.response.send_message(loop_watchdog.report(limit=5, stacks=False)[:1900], file=file, ephemeral=True)
+    else:
+        await interaction.response.send_message('You must be the owner to use this command!', ephemeral=True)
+
     
+@client.event
+async def on_guild_available(guild: discord.Guild):
+    guild_index.add_guild(guild.id, [member.id for member in guild.members])
+
+@client.event
+async def on_guild_join(guild: discord.Guild):
+    guild_index.add_guild(guild.id, [member.id for member in guild.members])
+
+@client.event
+async def on_guild_remove(guild: discord.Guild):
+    guild_index.remove_guild(guild.id)
+
+@client.event
+async def on_member_join(member: discord.Member):
+    guild_index.add_member(member.guild.id, member.id)
+
+@client.event
+async def on_member_remove(member: discord.Member):
+    guild_index.remove_member(member.guild.id, member.id)
+
 @client.event
 async def on_command_error(ctx, error):
     if isinstance(error, commands.MissingPermissions):
@@ -1116,20 +1199,7 @@ async def on_command_error(ctx, error):
     else:
         await ctx.send(f"An unexpected error occurred: {error}")
 
-def clear_wins():
-    arena_games = load_arena_games()
-    for user_id in arena_games:
-        arena_games[user_id]['arena_games'] = {}
-        arena_games[user_id]['latest_update'] = None
-    save_arena_games(arena_games)
-
-# Check github status
-github_status()
-
-# Clear wins every time program gets updated to match with the latest version, except for development
-if not env.get('BOT_TOKEN_DEV'):
-    clear_wins()
-
-# Start the program
-client.run(BOT_TOKEN)
+# Start the program, unless imported (e.g. by the benchmarks)
+if __name__ == "__main__":
+    client.run(BOT_TOKEN)
 
@@ -0,0 +1,145 @@
+import asyncio
+import os, json
+import re
+import tempfile
+import zlib
+from collections import OrderedDict
+
+MATCH_CACHE_DIR = "match_cache"
+MAX_CACHE_SIZE = 1024 * 1024 * 1024  # 1 GB of compressed matches
+COMPRESSION_LEVEL = 6
+SUFFIX = ".json.z"
+
+_VALID_MATCH_ID = re.compile(r"^[A-Za-z0-9_]+$")
+
+
+class MatchCache:
+    """On-disk cache of raw match-v5 payloads, zlib compressed, one file per match ID.
+
+    Files are spread over sub directories by the last two characters of the match ID. The least
+    recently used matches are evicted once the total size goes over max_size; the file modification
+    time is used as the last use so the order survives restarts. The index of the files on disk is
+    built by load(), which has to be called before the cache is used.
+    """
+
+    def __init__(self, directory=MATCH_CACHE_DIR, max_size=MAX_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.total_size = 0
+        self.entries = OrderedDict()  # match_id -> size, least recently used first
+
+    def load(self):
+        # Walks the whole cache directory, run it in an executor when there is an event loop
+        self.entries.clear()
+        self.total_size = 0
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(SUFFIX):
+                    stat = os.stat(os.path.join(root, name))
+                    files.append((stat.st_mtime, name[:-len(SUFFIX)], stat.st_size))
+        for _, match_id, size in sorted(files):
+            self.entries[match_id] = size
+            self.total_size += size
+
+    def _path(self, match_id):
+        return os.path.join(self.directory, match_id[-2:], match_id + SUFFIX)
+
+    def __contains__(self, match_id):
+        return match_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match_ids(self):
+        return list(self.entries)
+
+    # The file reads, writes and (de)compression block, get_async() and put_async() run them in an executor
+    @staticmethod
+    def _read(path):
+        with open(path, "rb") as file:
+            payload = json.loads(zlib.decompress(file.read()))
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return payload
+
+    @staticmethod
+    def _write(path, payload):
+        """Returns the compressed size."""
+        data = zlib.compress(json.dumps(payload, separators=(",", ":")).encode(), COMPRESSION_LEVEL)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # A temp file per write, writes of the same match can run at the same time in the executor
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        return len(data)
+
+    def _stored(self, match_id, size):
+        self.total_size += size - self.entries.pop(match_id, 0)
+        self.entries[match_id] = size
+        self._evict()
+
+    def get(self, match_id):
+        if match_id not in self.entries:
+            return None
+        try:
+            payload = self._read(self._path(match_id))
+        except (OSError, zlib.error, ValueError):
+            # Removed or corrupt file, forget about it so it gets downloaded again
+            self._forget(match_id)
+            return None
+        self.entries.move_to_end(match_id)
+        return payload
+
+    async def get_async(self, match_id):
+        if match_id not in self.entries:
+            return None
+        try:
+            payload = await asyncio.get_running_loop().run_in_executor(None, self._read, self._path(match_id))
+        except (OSError, zlib.error, ValueError):
+            # Removed or corrupt file, forget about it so it gets downloaded again
+            self._forget(match_id)
+            return None
+        if match_id in self.entries:
+            self.entries.move_to_end(match_id)
+        return payload
+
+    def put(self, match_id, payload):
+        if not _VALID_MATCH_ID.match(match_id):
+            return
+        self._stored(match_id, self._write(self._path(match_id), payload))
+
+    async def put_async(self, match_id, payload):
+        if not _VALID_MATCH_ID.match(match_id):
+            return
+        try:
+            size = await asyncio.get_running_loop().run_in_executor(None, self._write, self._path(match_id), payload)
+        except OSError as e:
+            # Only the cache misses the match, the sync that downloaded it goes on
+            print(f"Error while caching match {match_id}: {e}")
+            return
+        self._stored(match_id, size)
+
+    def _forget(self, match_id):
+        self.total_size -= self.entries.pop(match_id, 0)
+
+    def _evict(self):
+        while self.total_size > self.max_size and len(self.entries) > 1:
+            match_id = next(iter(self.entries))
+            try:
+                os.remove(self._path(match_id))
+            except OSError:
+                pass
+            self._forget(match_id)
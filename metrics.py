@@ -0,0 +1,230 @@
+import functools
+import time
+from aiohttp import web
+from profiling import profiler
+
+METRICS_HOST = "127.0.0.1"  # only reachable from the machine itself, e.g. by a local Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.values = {}  # label values -> value
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.values.items()):
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(key)} {value}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        counts = self.values.get(key)
+        if counts is None:
+            # [count per bucket (not cumulative), +Inf count, sum]
+            counts = self.values[key] = [[0] * len(self.buckets), 0, 0.0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[0][index] += 1
+                break
+        counts[1] += 1
+        counts[2] += value
+
+    def _render_value(self, key, value):
+        bucket_counts, count, total = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def quantile(self, key, quantile):
+        """Upper bound of the bucket the quantile falls in, like histogram_quantile without interpolation."""
+        bucket_counts, count, _ = self.values[key]
+        rank = quantile * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self, limit=10):
+        """Short human readable overview: slowest handlers and Riot endpoints, error and retry counts."""
+        lines = []
+        for metric in self.metrics:
+            if not metric.values:
+                continue
+            lines.append(metric.description)
+            if isinstance(metric, Histogram):
+                rows = sorted(metric.values.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+                for key, (_, count, total) in rows:
+                    labels = " ".join(str(value) for _, value in key) or metric.name
+                    lines.append(f"  {labels}: {count}x, avg {total / count * 1000:.0f} ms, p95 <= {metric.quantile(key, 0.95)} s")
+            else:
+                for key, value in sorted(metric.values.items())[:limit]:
+                    labels = " ".join(str(label) for _, label in key) or metric.name
+                    lines.append(f"  {labels}: {value:g}")
+        return "\n".join(lines) or "No metrics recorded yet."
+
+
+registry = MetricsRegistry()
+
+# Riot API
+riot_request_seconds = registry.register(Histogram(
+    "riot_request_seconds", "Riot API request latency", ("endpoint", "status")
+))
+riot_rate_limited_total = registry.register(Counter(
+    "riot_rate_limited_total", "Riot API 429 responses", ("endpoint",)
+))
+riot_retries_total = registry.register(Counter(
+    "riot_retries_total", "Riot API requests retried", ("endpoint", "reason")
+))
+
+# Storage
+arena_games_load_seconds = registry.register(Histogram(
+    "arena_games_load_seconds", "Loading all arena games from the storage"
+))
+arena_games_flush_seconds = registry.register(Histogram(
+    "arena_games_flush_seconds", "Writing changed arena games to the storage"
+))
+
+# Discord
+handler_seconds = registry.register(Histogram(
+    "discord_handler_seconds", "Slash command and button callback duration", ("kind", "handler", "outcome")
+))
+
+# Event loop
+event_loop_lag_seconds = registry.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a scheduled callback",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 3, 10)
+))
+event_loop_stalls_total = registry.register(Counter(
+    "event_loop_stalls_total", "Event loop blocked longer than the threshold, by call site", ("site",)
+))
+
+# Syncs
+sync_seconds = registry.register(Histogram(
+    "sync_seconds", "Duration of update_arena_games", buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+))
+sync_matches_total = registry.register(Counter(
+    "sync_matches_downloaded_total", "Match details downloaded by syncs"
+))
+sync_matches_per_second = registry.register(Gauge(
+    "sync_matches_per_second", "Match download rate of the last sync"
+))
+
+
+def timed(kind, name=None):
+    """Records the duration of an async slash command or view callback, e.g. @timed("command", "wins").
+
+    The handler is labelled with name, or the qualified function name when no name is given.
+    It is also the hook of the on-demand profiler, see profiling.HandlerProfiler.
+    """
+    def decorator(function):
+        handler = name or function.__qualname__
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                if profiler.session is not None and profiler.wants(handler):
+                    result = await profiler.profile(handler, function(*args, **kwargs))
+                else:
+                    result = await function(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                handler_seconds.observe(time.perf_counter() - start, kind=kind, handler=handler, outcome=outcome)
+        return wrapper
+    return decorator
+
+
+class MetricsServer:
+    """Serves the registry on http://METRICS_HOST:port/metrics."""
+
+    def __init__(self, port, metrics_registry=registry):
+        self.port = port
+        self.registry = metrics_registry
+        self.runner = None
+
+    async def handle_metrics(self, request):
+        return web.Response(text=self.registry.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, METRICS_HOST, self.port).start()
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
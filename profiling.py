@@ -0,0 +1,155 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+DEFAULT_SECONDS = 5 * 60  # a session without a limit ends after this long
+TRACEMALLOC_FRAMES = 1  # the report groups by line, more frames only slow down every allocation
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 25
+
+
+def take_snapshot():
+    """Snapshot of the traced allocations, without the ones of tracemalloc and the import system."""
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ])
+
+
+class ProfilingSession:
+    def __init__(self, seconds, invocations, handler, on_finish):
+        self.seconds = seconds
+        self.invocations = invocations  # profile this many handler calls, None for all calls within the time
+        self.handler = handler  # only profile this handler, None for all handlers
+        self.on_finish = on_finish
+        self.started = 0  # handler calls that started profiled
+        self.finished = 0
+        self.running = 0  # handler calls running now, the profiler is enabled while there are any
+        self.handler_counts = {}
+        self.start_time = time.perf_counter()
+        self.profile = cProfile.Profile()
+        self.snapshot = None
+        self.own_tracemalloc = False  # tracemalloc was started by the session, and is stopped with it
+        self.timer = None
+
+
+class HandlerProfiler:
+    """Profiles slash command and view callbacks on demand, started by the owner with /profile.
+
+    cProfile only runs while a profiled handler is running, tracemalloc for the whole session.
+    When no session is running, the handlers only pay for checking self.session.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.last_report = None
+        self._finish_task = None
+
+    def start(self, seconds=None, invocations=None, handler=None, on_finish=None):
+        """Starts a session of seconds and/or invocations. on_finish(report) is awaited when one of them ends it."""
+        if self.session is not None:
+            raise RuntimeError("A profiling session is already running")
+        if seconds is None and invocations is None:
+            seconds = DEFAULT_SECONDS
+        session = ProfilingSession(seconds, invocations, handler, on_finish)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            session.own_tracemalloc = True
+        session.snapshot = take_snapshot()
+        if seconds:
+            session.timer = asyncio.get_running_loop().call_later(seconds, self._finish)
+        self.session = session
+
+    def wants(self, handler):
+        session = self.session
+        if session.handler is not None and session.handler != handler:
+            return False
+        return session.invocations is None or session.started < session.invocations
+
+    async def profile(self, handler, coroutine):
+        session = self.session
+        session.started += 1
+        session.handler_counts[handler] = session.handler_counts.get(handler, 0) + 1
+        if session.running == 0:
+            try:
+                session.profile.enable()
+            except ValueError:
+                pass  # Another profiler is active
+        session.running += 1
+        try:
+            return await coroutine
+        finally:
+            session.running -= 1
+            if session.running == 0:
+                session.profile.disable()
+            session.finished += 1
+            if self.session is session and session.invocations is not None and session.finished >= session.invocations:
+                self._finish()
+
+    def _finish(self):
+        session = self.session
+        report = self.stop()
+        if session.on_finish is not None:
+            self._finish_task = asyncio.create_task(session.on_finish(report))
+
+    def stop(self):
+        """Ends the running session and returns its report, None when no session was running."""
+        session = self.session
+        if session is None:
+            return None
+        self.session = None
+        if session.timer is not None:
+            session.timer.cancel()
+        session.profile.disable()
+        self.last_report = self._report(session)
+        if session.own_tracemalloc:
+            tracemalloc.stop()
+        return self.last_report
+
+    def status(self):
+        session = self.session
+        if session is None:
+            return "No profiling session is running."
+        limits = []
+        if session.seconds:
+            limits.append(f"{max(0, session.seconds - (time.perf_counter() - session.start_time)):.0f} s left")
+        if session.invocations is not None:
+            limits.append(f"{session.finished}/{session.invocations} invocations")
+        return f"Profiling {session.handler or 'all handlers'}: " + ", ".join(limits)
+
+    @staticmethod
+    def _report(session):
+        # Before the CPU report, which allocates too
+        snapshot = take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        output = io.StringIO()
+        output.write(f"Profiled for {time.perf_counter() - session.start_time:.1f} s, {session.finished} invocations\n")
+        for handler, count in sorted(session.handler_counts.items(), key=lambda item: item[1], reverse=True):
+            output.write(f"  {handler}: {count}\n")
+        output.write(
+            "\nOther tasks running on the event loop during a profiled handler are included in the CPU profile.\n"
+        )
+
+        for sort in ("cumulative", "tottime"):
+            output.write(f"\nTop {TOP_FUNCTIONS} functions by {sort} time\n")
+            try:
+                stats = pstats.Stats(session.profile, stream=output)
+            except TypeError:
+                output.write("  Nothing was profiled\n")
+                break
+            stats.sort_stats(sort).print_stats(TOP_FUNCTIONS)
+
+        output.write(f"\nTraced memory: {current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB\n")
+        output.write(f"Top {TOP_ALLOCATIONS} allocation sites, growth during the session\n")
+        top_stats = snapshot.compare_to(session.snapshot, "lineno")
+        for stat in top_stats[:TOP_ALLOCATIONS]:
+            output.write(f"  {stat}\n")
+        return output.getvalue()
+
+
+profiler = HandlerProfiler()
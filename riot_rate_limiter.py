@@ -0,0 +1,190 @@
+import asyncio
+import random
+import re
+import time
+
+# Development keys, used until the first response tells us the real limits
+DEFAULT_APP_LIMITS = [(20, 1), (100, 120)]
+MAX_RETRIES = 5
+BASE_BACKOFF = 1  # seconds
+MAX_BACKOFF = 60  # seconds
+
+# Number of path segments after these keywords that are ids or names, e.g. /by-riot-id/{gameName}/{tagLine}
+PATH_PARAMETERS = {"by-riot-id": 2, "by-puuid": 1, "by-summoner": 1}
+MATCH_ID = re.compile(r"[A-Z0-9]+_\d+")
+
+
+def method_key(path):
+    """Turns an url path into the endpoint it belongs to, so all calls of one endpoint share a method bucket."""
+    segments = path.split("?")[0].strip("/").split("/")
+    skip = 0
+    for index, segment in enumerate(segments):
+        if skip:
+            segments[index] = "{}"
+            skip -= 1
+        elif segment in PATH_PARAMETERS:
+            skip = PATH_PARAMETERS[segment]
+        elif MATCH_ID.fullmatch(segment):
+            segments[index] = "{matchId}"
+    return "/" + "/".join(segments)
+
+
+def parse_rate_limit(header):
+    """Parses '20:1,100:120' into [(20, 1), (100, 120)]: requests per window of seconds."""
+    limits = []
+    for part in (header or "").split(","):
+        if ":" in part:
+            requests, seconds = part.split(":", 1)
+            limits.append((int(requests), int(seconds)))
+    return limits
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full jitter exponential backoff, Retry-After always wins when the server sends one."""
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 0.5)
+    return random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+
+
+class TokenBucket:
+    """A fixed window bucket of `limit` requests per `window` seconds."""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.count = 0
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+
+    def delay(self, now):
+        blocked = max(0, self.blocked_until - now)
+        if now >= self.reset_at or self.count < self.limit:
+            return blocked
+        return max(blocked, self.reset_at - now)
+
+    def acquire(self, now):
+        if now >= self.reset_at:
+            self.count = 0
+            self.reset_at = now + self.window
+        self.count += 1
+
+    def sync(self, count, now):
+        # The server count also includes requests done by other processes using the same key
+        if now >= self.reset_at:
+            self.count = 0
+            self.reset_at = now + self.window
+        self.count = max(self.count, count)
+
+    def block(self, seconds, now):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class BucketGroup:
+    """All windows of one rate limit (e.g. 20 per second and 100 per 2 minutes)."""
+
+    def __init__(self, limits):
+        self.buckets = {}
+        self.update_limits(limits)
+
+    def update_limits(self, limits):
+        buckets = {}
+        for limit, window in limits:
+            bucket = self.buckets.get(window) or TokenBucket(limit, window)
+            bucket.limit = limit
+            buckets[window] = bucket
+        self.buckets = buckets
+
+    def delay(self, now):
+        return max((bucket.delay(now) for bucket in self.buckets.values()), default=0)
+
+    def acquire(self, now):
+        for bucket in self.buckets.values():
+            bucket.acquire(now)
+
+    def sync_counts(self, counts, now):
+        for count, window in counts:
+            if window in self.buckets:
+                self.buckets[window].sync(count, now)
+
+    def block(self, seconds, now):
+        for bucket in self.buckets.values():
+            bucket.block(seconds, now)
+
+
+class RiotRateLimiter:
+    """Schedules Riot API requests using the limits the API reports in its response headers.
+
+    The app limit is shared by all endpoints of a routing region (europe, euw1, ...), the method
+    limits are per endpoint and region. Call `await acquire(region, method)` before each request
+    and `update(region, method, status, headers)` with the response.
+    """
+
+    def __init__(self, default_app_limits=DEFAULT_APP_LIMITS):
+        self.default_app_limits = default_app_limits
+        self.app_buckets = {}
+        self.method_buckets = {}
+        self.locks = {}
+
+    def _app(self, region):
+        if region not in self.app_buckets:
+            self.app_buckets[region] = BucketGroup(self.default_app_limits)
+        return self.app_buckets[region]
+
+    def _method(self, region, method):
+        key = (region, method)
+        if key not in self.method_buckets:
+            # Unknown until the first response, the app limit protects us meanwhile
+            self.method_buckets[key] = BucketGroup([])
+        return self.method_buckets[key]
+
+    async def acquire(self, region, method):
+        # One lock per bucket keeps the waiting requests in order
+        lock = self.locks.setdefault((region, method), asyncio.Lock())
+        async with lock:
+            app, method_group = self._app(region), self._method(region, method)
+            while True:
+                now = time.monotonic()
+                delay = max(app.delay(now), method_group.delay(now))
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            app.acquire(now)
+            method_group.acquire(now)
+
+    def update(self, region, method, status, headers):
+        """Learns the limits and current counts from the response headers.
+
+        Returns True when a 429 blocked one of the buckets, acquire() then waits for Retry-After by itself.
+        """
+        now = time.monotonic()
+        app, method_group = self._app(region), self._method(region, method)
+
+        app_limits = parse_rate_limit(headers.get("X-App-Rate-Limit"))
+        if app_limits:
+            app.update_limits(app_limits)
+            app.sync_counts(parse_rate_limit(headers.get("X-App-Rate-Limit-Count")), now)
+        method_limits = parse_rate_limit(headers.get("X-Method-Rate-Limit"))
+        if method_limits:
+            method_group.update_limits(method_limits)
+            method_group.sync_counts(parse_rate_limit(headers.get("X-Method-Rate-Limit-Count")), now)
+
+        if status == 429:
+            retry_after = self.retry_after(headers)
+            if retry_after is not None:
+                # Only block the bucket that was exceeded. Service limits have no rate limit type,
+                # they only back off the request itself
+                limit_type = headers.get("X-Rate-Limit-Type")
+                if limit_type == "method":
+                    method_group.block(retry_after, now)
+                    return True
+                elif limit_type == "application":
+                    app.block(retry_after, now)
+                    return True
+        return False
+
+    @staticmethod
+    def retry_after(headers):
+        try:
+            return float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return None
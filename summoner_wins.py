@@ -1,183 +1,376 @@
 import aiohttp
 import asyncio
-import os, json
 import time
 import discord
-from riotwatcher import LolWatcher, ApiError
+from urllib.parse import urlparse
+from arena_cache import ArenaGamesCache
+from match_cache import MatchCache
+from champion_index import ChampionIndex
+from arena_records import ArenaGame, ArenaStats
+from riot_rate_limiter import RiotRateLimiter, MAX_RETRIES, backoff_delay, method_key
+import metrics
 
-# Helper function to load or initialize the wins data
-def load_arena_games():
-    if os.path.exists(GAMES_FILENAME):
-        try:
-            with open(GAMES_FILENAME, "r") as file:
-                return json.load(file)
-        except json.JSONDecodeError:
-            return {}
-    return {}
-
-# Helper function to save the wins data
-def save_arena_games(data):
-    with open(GAMES_FILENAME, "w") as file:
-        json.dump(data, file, indent=4)
+MAX_CONCURRENT_REQUESTS = 10  # match downloads in flight at the same time during a sync
+MATCH_IDS_PER_PAGE = 100  # maximum count allowed by the match-v5 ids endpoint
+ARENA_QUEUE_IDS = (1700, 1710)  # Arena queues, older and current version of the mode
+PROGRESS_INTERVAL = 5  # seconds between two progress updates of the sync message, Discord rate limits the edits
+RIOT_API_URL = "https://{region}.api.riotgames.com"
 
-GAMES_FILENAME = "arena_games.json"
+# Connection pool shared by all Riot API traffic
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 30
+KEEPALIVE_TIMEOUT = 60  # seconds an idle connection is kept open
+DNS_CACHE_TTL = 300  # seconds
+REQUEST_TIMEOUT = 30  # seconds
 
 class CustomRiotAPI:
-    def __init__(self, api_key, region='europe'):
+    def __init__(self, api_key, games_cache: ArenaGamesCache, match_cache: MatchCache = None, region='europe', max_concurrent_requests=MAX_CONCURRENT_REQUESTS, base_url=None):
         self.api_key = api_key
+        self.games_cache = games_cache
+        self.match_cache = match_cache
         self.region = region
-        self.lol_watcher = LolWatcher(api_key)
+        # Another server speaking the Riot API, e.g. the local fake in benchmarks/fake_riot_api.py
+        self.base_url = (base_url or RIOT_API_URL.format(region=region)).rstrip('/')
+        self.max_concurrent_requests = max_concurrent_requests
         self.arena_god_challenge_id = 602002
         self.rate_limited = False
-        self.session = aiohttp.ClientSession()  # Initialize the session
-        
+        self.rate_limiter = RiotRateLimiter()  # Shared by all syncs, so together they stay within the key's limits
+        self.request_count = 0  # HTTP requests sent to Riot since startup
+        self.syncs_in_progress = set()  # user keys
+        self.match_downloads = {}  # match_id -> Future of a match being fetched, shared by concurrent syncs
+        self.session = None  # Created by start() from within the running event loop
+
+    async def start(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=CONNECTION_LIMIT,
+                limit_per_host=CONNECTION_LIMIT_PER_HOST,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=DNS_CACHE_TTL
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def make_request(self, url, headers):
+        parsed_url = urlparse(url)
+        region = self.region
+        method = method_key(parsed_url.path)
 
-    async def make_request(self, url, headers, retry=0):
-        async with aiohttp.ClientSession() as session:
-            while True:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
+        if self.session is None:
+            await self.start()
+
+        for attempt in range(MAX_RETRIES + 1):
+            await self.rate_limiter.acquire(region, method)
+            self.request_count += 1
+            request_start = time.perf_counter()
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    status = response.status
+                    metrics.riot_request_seconds.observe(time.perf_counter() - request_start, endpoint=method, status=status)
+                    bucket_blocked = self.rate_limiter.update(region, method, status, response.headers)
+                    if status == 200:
                         if self.rate_limited:
                             # print("No longer rate limited")
                             self.rate_limited = False
                         return await response.json()
-                    elif response.status == 403:
+                    elif status == 403:
                         # print('Forbidden: Check your API key and permissions.')
                         return None
-                    elif response.status == 404:
+                    elif status == 404:
                         # print('Resource not found.')
                         return None
-                    elif response.status == 429:
+                    elif status == 429:
+                        metrics.riot_rate_limited_total.inc(endpoint=method)
                         if not self.rate_limited:
-                            # print(f"Rate limit response ({response.status}). Awaiting")
+                            # print(f"Rate limit response ({status}). Awaiting")
                             self.rate_limited = True
-                        await asyncio.sleep(10)
-                        return await self.make_request(url, headers)
+                        # The limiter already holds back the blocked bucket until Retry-After has passed
+                        delay = 0 if bucket_blocked else backoff_delay(attempt, self.rate_limiter.retry_after(response.headers))
                     else:
-                        response_data = await response.json()
-                        print(f"Error: {response.status} - {response_data}")
-                        if retry > 3:
-                            return None
-                        return await self.make_request(url, headers, retry+1)
+                        response_data = await response.text()
+                        print(f"Error: {status} - {response_data}")
+                        delay = backoff_delay(attempt)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Dropped connections and requests over REQUEST_TIMEOUT are retried like a 5xx
+                status = type(e).__name__
+                print(f"Error: {status} on {parsed_url.path} - {e}")
+                delay = backoff_delay(attempt)
+            if attempt == MAX_RETRIES:
+                break
+            metrics.riot_retries_total.inc(endpoint=method, reason=status)
+            await asyncio.sleep(delay)
+
+        print(f"Error: giving up on {parsed_url.path} after {MAX_RETRIES} retries")
+        return None
 
     async def is_api_token_valid(self, riot_id, tagline):
-        url = f'https://{self.region}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{riot_id}/{tagline}'
+        url = f'{self.base_url}/riot/account/v1/accounts/by-riot-id/{riot_id}/{tagline}'
         headers = {'X-Riot-Token': self.api_key}
         response = await self.make_request(url, headers)
         return True if response is not None else False
     
     async def get_puuid(self, riot_id, tagline):
-        url = f'https://{self.region}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{riot_id}/{tagline}'
+        url = f'{self.base_url}/riot/account/v1/accounts/by-riot-id/{riot_id}/{tagline}'
         headers = {'X-Riot-Token': self.api_key}
         account_response = await self.make_request(url, headers)
         return account_response.get('puuid') if account_response else None
 
     async def get_stats(self, participant):
-        return {
-            "total_damage": participant['totalDamageDealtToChampions'],
-            "total_kills": participant['kills'],
-            "total_deaths": participant['deaths'],
-            "total_assists": participant['assists'],
-            "total_heal" : participant['totalHeal'],
-            "total_self_healing": participant['totalHeal'],
-            "total__healing_on_allies": participant['totalHealsOnTeammates'],
-            "total_shielding": participant['totalHealsOnTeammates'],
-            "total_shielding_on_teammate": participant['totalDamageShieldedOnTeammates'],
-            "physical_damage_taken": participant['physicalDamageTaken'],
-            "cc_duration": participant['totalTimeCCDealt'],
-            "highest_crit": participant['largestCriticalStrike'],
-            "ability_1_used": participant['spell1Casts'],
-            "ability_2_used": participant['spell2Casts'],
-            "ability_3_used": participant['spell3Casts'],
-            "ability_4_used": participant['spell4Casts'],
-            "playerAugment1": participant['playerAugment1'],
-            "playerAugment2": participant['playerAugment2'],
-            "playerAugment3": participant['playerAugment3'],
-            "gold_earned": participant['goldEarned'],
-            "largestKillingSpree": participant['largestKillingSpree']
-        }
-        
-    async def update_arena_games(self, interaction: discord.Interaction, user_key, user_name, puuid, lol_champions, latest_update=None, summoner_name=None, tagline=None):
-        def get_teammate_info(match_details, team_id, puuuid_owner):
-            participants = match_details['info']['participants']
-            for participant in participants:
-                if participant['playerSubteamId'] == team_id and participant['puuid'] != puuuid_owner:
-                    teammate_name = participant['riotIdGameName']
-                    normalized_champion_name = normalize_name(participant['championName'])
-                    teammate_champion = next(
-                        (champion for champion in lol_champions if normalize_name(champion) == normalized_champion_name),
-                        participant['championName']
-                    )
-                    return teammate_name, teammate_champion
-            return "Unknown", "Unknown"
-
-        def normalize_name(name):
-            return name.lower().replace("'", "").replace(" ", "")
-
-        matches = []
-        start = 0
-        count = 10  # count per request
-        
-        arena_start_date = latest_update or 1740787261000  # 1 May 2024, Release date Arena (God Title)
-        current_last_game = arena_start_date + 1
+        # total_self_healing and total_shielding are the same values as total_heal and total__healing_on_allies
+        return ArenaStats(
+            total_damage=participant['totalDamageDealtToChampions'],
+            total_kills=participant['kills'],
+            total_deaths=participant['deaths'],
+            total_assists=participant['assists'],
+            total_heal=participant['totalHeal'],
+            total__healing_on_allies=participant['totalHealsOnTeammates'],
+            total_shielding_on_teammate=participant['totalDamageShieldedOnTeammates'],
+            physical_damage_taken=participant['physicalDamageTaken'],
+            cc_duration=participant['totalTimeCCDealt'],
+            highest_crit=participant['largestCriticalStrike'],
+            ability_1_used=participant['spell1Casts'],
+            ability_2_used=participant['spell2Casts'],
+            ability_3_used=participant['spell3Casts'],
+            ability_4_used=participant['spell4Casts'],
+            playerAugment1=participant['playerAugment1'],
+            playerAugment2=participant['playerAugment2'],
+            playerAugment3=participant['playerAugment3'],
+            gold_earned=participant['goldEarned'],
+            largestKillingSpree=participant['largestKillingSpree']
+        )
         
-        while current_last_game > arena_start_date:
-            match_url = f'https://{self.region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?start={start}&count={count}'
-            headers = {'X-Riot-Token': self.api_key}
-            match_ids = await self.make_request(match_url, headers)
-            if not match_ids:
+    async def parse_arena_game(self, match_details, puuid, champion_index: ChampionIndex):
+        """Extracts the game of one participant from an arena match, None if the puuid didn't play in it."""
+        def champion_of(participant):
+            return champion_index.resolve(participant['championName'], participant['championName'])
+
+        participants = match_details['info']['participants']
+        player = next((participant for participant in participants if participant['puuid'] == puuid), None)
+        if player is None:
+            return None
+
+        teammate_name, teammate_champion = "Unknown", "Unknown"
+        for participant in participants:
+            if participant['playerSubteamId'] == player['playerSubteamId'] and participant['puuid'] != puuid:
+                teammate_name = participant['riotIdGameName']
+                teammate_champion = champion_of(participant)
                 break
 
-            for match_id in match_ids:
-                match_details = await self.get_match_details(match_id)
-                if match_details:
-                    game_creation = match_details['info'].get('gameCreation')
-                    if match_details.get('info').get('gameMode') == "CHERRY":
-                        stats = {}
-                    
-                        participants = match_details['info']['participants']
-                        for participant in participants:
-                            if participant['puuid'] == puuid:
-                                placement = participant['placement']
-                                team_id = participant['playerSubteamId']
-                                stats = await self.get_stats(participant)
-                                normalized_champion_name = normalize_name(participant['championName'])
-                                champion_name = next(
-                                    (champion for champion in lol_champions if normalize_name(champion) == normalized_champion_name),
-                                    participant['championName']
-                                )
-                        teammate_name, teammate_champion = get_teammate_info(match_details, team_id, puuid)
-                        matches.append({
-                            match_id: {
-                                "champion": champion_name,
-                                "teammate_name": teammate_name,
-                                "teammate_champion": teammate_champion,
-                                "timestamp": game_creation,
-                                "place": placement,
-                                "stats": stats
-                            }
-                        })                    
-                    current_last_game = game_creation
-
-            start += count
-            
-        await self.session.close() # Close connections
-        arena_games = load_arena_games()
-
-        if user_key not in arena_games:
-            arena_games[user_key] = {"name": user_name, "summoner_name": summoner_name, "summoner_tagline": tagline, "arena_games": {}}
-        
-        if "arena_games" not in arena_games[user_key]:
-            arena_games[user_key]["arena_games"] = {}
-
-        for match in matches:
-            for match_id, match_details in match.items():
-                arena_games.get(user_key).get('arena_games')[match_id] = match_details
-        arena_games[user_key]['latest_update'] = int(time.time()) * 1000
-        save_arena_games(arena_games)
-        return
-    
+        return ArenaGame(
+            champion=champion_of(player),
+            teammate_name=teammate_name,
+            teammate_champion=teammate_champion,
+            timestamp=match_details['info'].get('gameCreation'),
+            place=player['placement'],
+            stats=await self.get_stats(player)
+        )
+
+    async def update_arena_games(self, interaction: discord.Interaction, user_key, user_name, puuid, champion_index: ChampionIndex, latest_update=None, summoner_name=None, tagline=None, request_limit=None):
+        # One sync per user at a time, e.g. the background sync and /wins. The second one only downloads what the first missed
+        # Returns False when the sync stopped before all matches were synced: at a failed request, or between two pages
+        # once request_count reached request_limit. The next sync continues from the checkpoint
+        async with self.games_cache.user_lock(user_key):
+            return await self._update_arena_games(interaction, user_key, user_name, puuid, champion_index, latest_update, summoner_name, tagline, request_limit)
+
+    async def _update_arena_games(self, interaction: discord.Interaction, user_key, user_name, puuid, champion_index: ChampionIndex, latest_update=None, summoner_name=None, tagline=None, request_limit=None):
+        # Limits the requests in flight for this sync, both for the match ids and the match details
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+
+        async def fetch_match_ids(queue, since, until, start):
+            # Only arena matches played in the window are listed, the rest is filtered by the API
+            match_url = (
+                f'{self.base_url}/lol/match/v5/matches/by-puuid/{puuid}/ids'
+                f'?queue={queue}&startTime={since // 1000}&endTime={until // 1000}&start={start}&count={MATCH_IDS_PER_PAGE}'
+            )
+            headers = {'X-Riot-Token': self.api_key}
+            async with semaphore:
+                return await self.make_request(match_url, headers)
+
+        async def fetch_match_details(match_id):
+            async with semaphore:
+                return match_id, await self.get_match_details(match_id)
+
+        def game_creation_of(result):
+            _, match_details = result
+            return match_details['info'].get('gameCreation') or 0
+
+        def progress():
+            """Share of the time span of all windows and queues that is synced, between 0 and 1."""
+            total = covered = 0
+            for window in windows:
+                span = max(window["until"] - window["since"], 1)
+                for queue in ARENA_QUEUE_IDS:
+                    state = window["queues"].get(str(queue))
+                    total += span
+                    if state is None:
+                        continue
+                    covered += span if state["done"] else min(max(window["until"] - state["oldest"], 0), span)
+            return covered / total
+
+        async def report_progress():
+            nonlocal last_report
+            now = time.perf_counter()
+            if interaction is None or now - last_report < PROGRESS_INTERVAL:
+                return
+            last_report = now
+            done = progress()
+            eta = ""
+            if done > start_progress:
+                seconds_left = (now - sync_start) * (1 - done) / (done - start_progress)
+                eta = f", about {round(seconds_left / 60)} min left" if seconds_left >= 60 else ", less than a minute left"
+            name = user_data.get('summoner_name') or user_name
+            content = (
+                f"Syncing **{name}** with Riot Games: {processed} matches processed, {new_games} new games "
+                f"({done:.0%}{eta}) ⌛"
+            )
+            try:
+                await interaction.edit_original_response(content=content)
+            except discord.HTTPException as e:
+                print(f"Error while showing the sync progress: {e}")
+
+        def over_budget():
+            return request_limit is not None and self.request_count >= request_limit
+
+        async def sync_queue(queue, window):
+            """False when it stopped early, the checkpoint then stays at the last page that was stored completely."""
+            nonlocal downloaded, processed, new_games
+            since, until = window["since"], window["until"]
+            state = window["queues"].setdefault(str(queue), {"start": 0, "oldest": until + 1, "done": False})
+            if state["done"]:
+                return True
+            start = state["start"]
+            current_last_game = state["oldest"]
+
+            next_page = asyncio.create_task(fetch_match_ids(queue, since, until, start))
+            try:
+                while next_page is not None and current_last_game > since:
+                    if over_budget():
+                        return False
+                    match_ids = await next_page
+                    if match_ids is None:
+                        return False
+                    if not match_ids:
+                        break
+
+                    # Prefetch the next page of ids while the details of this page are downloaded, a short page is the last one
+                    start += MATCH_IDS_PER_PAGE
+                    next_page = asyncio.create_task(fetch_match_ids(queue, since, until, start)) if len(match_ids) == MATCH_IDS_PER_PAGE else None
+
+                    # Matches that were already stored, e.g. by the sync of a teammate, are not downloaded again
+                    known_games = [user_data.games[match_id] for match_id in match_ids if match_id in user_data.games]
+                    new_match_ids = [match_id for match_id in match_ids if match_id not in user_data.games]
+
+                    results = await asyncio.gather(*(fetch_match_details(match_id) for match_id in new_match_ids))
+                    downloaded += sum(1 for result in results if result[1])
+                    if not all(result[1] for result in results):
+                        # Skipping the failed matches would move the checkpoint past them, they would never be synced
+                        return False
+
+                    # Apply newest first, so current_last_game ends at the oldest game of the page
+                    matches = {}  # new games of this page per registered user
+                    for match_id, match_details in sorted(results, key=game_creation_of, reverse=True):
+                        if match_details.get('info').get('gameMode') == "CHERRY":
+                            # One download writes the game of every registered player in the match
+                            registered_players = self.games_cache.user_keys_by_puuid()
+                            for participant in match_details['info']['participants']:
+                                participant_key = registered_players.get(participant['puuid'])
+                                if participant_key is None:
+                                    continue
+                                game = await self.parse_arena_game(match_details, participant['puuid'], champion_index)
+                                matches.setdefault(participant_key, {})[match_id] = game
+                        current_last_game = game_creation_of((match_id, match_details))
+
+                    if known_games:
+                        current_last_game = min(current_last_game, min(game.timestamp for game in known_games))
+
+                    # Store the page right away, with the checkpoint after it, so a restart continues from here
+                    for match_user_key, user_matches in matches.items():
+                        self.games_cache.add_games(match_user_key, user_matches)
+                    processed += len(match_ids)
+                    new_games += len(matches.get(user_key, ()))
+                    state["start"], state["oldest"] = start, current_last_game
+                    self.games_cache.set_sync_checkpoint(user_key, checkpoint)
+                    await report_progress()
+            finally:
+                # Don't leave the prefetched page running when stopping early
+                if next_page is not None:
+                    next_page.cancel()
+            state["done"] = True
+            self.games_cache.set_sync_checkpoint(user_key, checkpoint)
+            return True
+
+        # Register the puuid first, so a concurrent sync of a teammate already shares its matches with this user.
+        # Also the summoner, so the background sync can resume this sync if it is interrupted
+        self.games_cache.update_user(user_key, name=user_name, puuid=puuid, summoner_name=summoner_name, summoner_tagline=tagline)
+        user_data = self.games_cache.get_user(user_key)
+
+        downloaded = 0  # match details fetched by this sync
+        processed = 0  # match ids handled by this sync, including the already stored ones
+        new_games = 0  # of this user
+        arena_start_date = latest_update or 1740787261000  # 1 May 2024, Release date Arena (God Title)
+        now = int(time.time()) * 1000
+
+        # Time windows to sync, every window is a fixed list of matches, so its page offsets stay valid after a restart
+        checkpoint = self.games_cache.sync_checkpoint(user_key)
+        if checkpoint and checkpoint["puuid"] == puuid and checkpoint["windows"][0]["since"] == arena_start_date:
+            # Continue the interrupted sync, then sync the matches played since it started
+            windows = checkpoint["windows"]
+            if windows[-1]["until"] < now:
+                windows.append({"since": windows[-1]["until"], "until": now, "queues": {}})
+        else:
+            windows = [{"since": arena_start_date, "until": now, "queues": {}}]
+            checkpoint = {"puuid": puuid, "windows": windows}
+
+        self.syncs_in_progress.add(user_key)
+        sync_start = time.perf_counter()
+        last_report = sync_start
+        start_progress = progress()
+        complete = True
+        try:
+            for index, window in enumerate(windows):
+                for queue in ARENA_QUEUE_IDS:
+                    complete = await sync_queue(queue, window)
+                    if not complete:
+                        break
+                if not complete:
+                    if not over_budget():
+                        print(f"Error: sync of {user_name} stopped, a Riot Games request failed")
+                    break
+                # The window is complete, the next sync starts at its end
+                self.games_cache.update_user(user_key, latest_update=window["until"])
+                checkpoint["windows"] = windows[index + 1:]
+                self.games_cache.set_sync_checkpoint(user_key, checkpoint if checkpoint["windows"] else None)
+        finally:
+            self.syncs_in_progress.discard(user_key)
+        sync_duration = time.perf_counter() - sync_start
+        metrics.sync_seconds.observe(sync_duration)
+        metrics.sync_matches_total.inc(downloaded)
+        metrics.sync_matches_per_second.set(downloaded / sync_duration if sync_duration else 0)
+        return complete
+
     async def get_match_details(self, match_id):
-        match_url = f'https://{self.region}.api.riotgames.com/lol/match/v5/matches/{match_id}'
+        # Syncs of players in the same match, e.g. duo partners, wait for the same download
+        download = self.match_downloads.get(match_id)
+        if download is None:
+            download = self.match_downloads[match_id] = asyncio.ensure_future(self._get_match_details(match_id))
+            download.add_done_callback(lambda _: self.match_downloads.pop(match_id, None))
+        # Shielded, a cancelled sync doesn't cancel the download for the other ones
+        return await asyncio.shield(download)
+
+    async def _get_match_details(self, match_id):
+        # Matches never change once played, so a cached copy is always up to date
+        if self.match_cache is not None:
+            cached_match = await self.match_cache.get_async(match_id)
+            if cached_match is not None:
+                return cached_match
+
+        match_url = f'{self.base_url}/lol/match/v5/matches/{match_id}'
         headers = {'X-Riot-Token': self.api_key}
-        return await self.make_request(match_url, headers)
+        match_details = await self.make_request(match_url, headers)
+        if match_details and self.match_cache is not None:
+            await self.match_cache.put_async(match_id, match_details)
+        return match_details
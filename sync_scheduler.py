@@ -0,0 +1,106 @@
+import asyncio
+import time
+from arena_cache import ArenaGamesCache
+from summoner_wins import CustomRiotAPI
+from champion_index import ChampionIndex
+
+SYNC_INTERVAL = 10 * 60  # seconds between two scheduling rounds
+REQUEST_BUDGET = 300  # Riot API requests a single round may use, leaves room for the syncs users start themselves
+MAX_CONCURRENT_SYNCS = 2
+MIN_SYNC_AGE = 30 * 60 * 1000  # ms, users synced more recently than this are skipped
+DAY = 24 * 60 * 60 * 1000  # ms
+
+
+def sync_priority(user_data, now):
+    """Higher is more urgent: long since the last sync, weighted by how recently the user played arena."""
+    latest_update = user_data.get('latest_update')
+    if not latest_update:
+        return float('inf')  # Never synced
+    staleness = now - latest_update
+    if staleness < MIN_SYNC_AGE:
+        return 0
+    last_game = max((game.timestamp for game in user_data.games.values() if game.timestamp), default=0)
+    days_since_last_game = (now - last_game) / DAY if last_game else 365
+    return staleness / (1 + days_since_last_game)
+
+
+class SyncScheduler:
+    """Periodically runs incremental syncs for all users with a linked summoner, in the background."""
+
+    def __init__(self, riot_api: CustomRiotAPI, games_cache: ArenaGamesCache, champion_index: ChampionIndex,
+                 interval=SYNC_INTERVAL, request_budget=REQUEST_BUDGET, max_concurrent_syncs=MAX_CONCURRENT_SYNCS):
+        self.riot_api = riot_api
+        self.games_cache = games_cache
+        self.champion_index = champion_index
+        self.interval = interval
+        self.request_budget = request_budget
+        self.max_concurrent_syncs = max_concurrent_syncs
+        self._task = None
+
+    def due_users(self):
+        now = int(time.time() * 1000)
+        candidates = [
+            (sync_priority(user_data, now), user_data) for user_data in self.games_cache.users()
+            if user_data.get('summoner_name') and user_data.get('summoner_tagline')
+            and user_data.user_key not in self.riot_api.syncs_in_progress
+        ]
+        candidates = [(priority, user_data) for priority, user_data in candidates if priority > 0]
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return [user_data for _, user_data in candidates]
+
+    async def sync_user(self, user_data, request_limit=None):
+        """False when the sync stopped early, see CustomRiotAPI.update_arena_games."""
+        summoner_name, tagline = user_data.get('summoner_name'), user_data.get('summoner_tagline')
+        puuid = user_data.get('puuid') or await self.riot_api.get_puuid(summoner_name, tagline)
+        if not puuid:
+            return False
+        return await self.riot_api.update_arena_games(
+            None, user_data.user_key, user_data.get('name'), puuid, self.champion_index,
+            user_data.get('latest_update'), summoner_name, tagline, request_limit
+        )
+
+    async def run_once(self):
+        """Syncs the most urgent users until the request budget of this round is used up. Returns the synced count.
+
+        A sync that is still running when the budget runs out stops after its current page, the next round resumes it.
+        """
+        budget_start = self.riot_api.request_count
+        request_limit = budget_start + self.request_budget
+        queue = self.due_users()
+        synced = 0
+
+        async def worker():
+            nonlocal synced
+            while queue and self.riot_api.request_count < request_limit:
+                user_data = queue.pop(0)
+                try:
+                    if await self.sync_user(user_data, request_limit):
+                        synced += 1
+                except Exception as e:
+                    print(f"Background sync failed for {user_data.get('summoner_name')}: {e}")
+
+        await asyncio.gather(*(worker() for _ in range(self.max_concurrent_syncs)))
+        return synced
+
+    async def _run(self):
+        while True:
+            try:
+                synced = await self.run_once()
+                if synced:
+                    print(f"Background sync: {synced} users updated")
+            except Exception as e:
+                print(f"Background sync round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None